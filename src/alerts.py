@@ -0,0 +1,291 @@
+"""
+Weather alerts for batches of cities.
+
+Each city's seasonal baseline (mean and standard deviation of its daily
+average temperatures within HALF_WIDTH days of today's calendar date in past
+years) is computed for all cities in one vectorized pass over the
+weather_daily rollup and cached for the day. Current observations are then
+scored together: a temperature more than Z_THRESHOLD standard deviations from
+its city's baseline raises an alert, alongside the severe-condition and air
+quality checks.
+
+A background refresher re-evaluates every user's favorite cities once per
+ALERT_REFRESH_INTERVAL and stores the results; pages read them with
+get_cached_alerts(), which never calls the weather API.
+"""
+import os
+import atexit
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from cache import SingleFlight, TTLCache
+from database import get_all_favorite_cities, get_seasonal_daily
+from models import CurrentWeather, is_error
+from weather_service import normalize_city, refresh_cities
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Standard deviations from the seasonal mean that count as unusual
+Z_THRESHOLD = float(os.getenv('ALERT_Z_THRESHOLD', 2.0))
+# Floor for the baseline spread (°C), so a few near-identical days do not flag every reading
+MIN_STD = float(os.getenv('ALERT_MIN_STD', 1.5))
+# Days of seasonal history a city needs before its temperature is scored
+MIN_DAYS = int(os.getenv('ALERT_MIN_DAYS', 3))
+# Days either side of today's calendar date that make up the seasonal window
+HALF_WIDTH = int(os.getenv('ALERT_SEASONAL_HALF_WIDTH', 15))
+# Seconds the baselines are reused before the rollup is read again
+BASELINE_TTL = float(os.getenv('ALERT_BASELINE_TTL', 3600))
+# Seconds between background refreshes of every favorite city's alerts
+REFRESH_INTERVAL = float(os.getenv('ALERT_REFRESH_INTERVAL', 600))
+
+SEVERE_CONDITIONS = ['thunderstorm', 'tornado', 'hurricane', 'blizzard', 'hail']
+# OpenWeather air quality index: 1 (good) to 5 (very poor)
+POOR_AIR_QUALITY_INDEX = 4
+
+
+class Baselines(NamedTuple):
+    """Seasonal temperature statistics; arrays are aligned with index positions."""
+    index: Dict[str, int]
+    mean: np.ndarray
+    std: np.ndarray
+    days: np.ndarray
+
+
+_baselines = TTLCache(BASELINE_TTL, max_entries=4)
+_flights = SingleFlight()
+
+# Latest alerts per normalized city name, written by refresh_alerts()
+_latest_alerts: Dict[str, List[str]] = {}
+_latest_lock = threading.Lock()
+
+
+def compute_baselines(now: Optional[datetime] = None, half_width: int = HALF_WIDTH) -> Baselines:
+    """
+    Compute the seasonal baseline of every city with history.
+
+    Args:
+        now (datetime): Reference time (default: now)
+        half_width (int): Days either side of today's calendar date
+
+    Returns:
+        Baselines: Per-city mean, sample standard deviation and day count
+    """
+    rows = get_seasonal_daily(now, half_width)
+    if not rows:
+        return Baselines({}, np.empty(0), np.empty(0), np.empty(0, dtype=int))
+
+    cities, temperatures = zip(*rows)
+    names, positions = np.unique(np.asarray(cities, dtype=object), return_inverse=True)
+    temperatures = np.asarray(temperatures, dtype=float)
+
+    days = np.bincount(positions, minlength=len(names))
+    mean = np.bincount(positions, weights=temperatures, minlength=len(names)) / days
+    squares = np.bincount(positions, weights=(temperatures - mean[positions]) ** 2, minlength=len(names))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        std = np.sqrt(squares / (days - 1))
+
+    logger.info(f"Computed seasonal baselines for {len(names)} cities from {len(rows)} days")
+    return Baselines({name: i for i, name in enumerate(names)}, mean, std, days)
+
+
+def get_baselines(now: Optional[datetime] = None, half_width: int = HALF_WIDTH) -> Baselines:
+    """Return the cached baselines for now's date, computing them once per BASELINE_TTL."""
+    key = ((now or datetime.now()).date().isoformat(), half_width)
+    baselines = _baselines.get(key)
+    if baselines is None:
+        def load():
+            result = compute_baselines(now, half_width)
+            _baselines.set(key, result)
+            return result
+        baselines = _flights.do(key, load)
+    return baselines
+
+
+def clear_baselines() -> None:
+    """Drop cached baselines, e.g. after history was imported."""
+    _baselines.clear()
+
+
+def score_temperatures(cities: Sequence[str], temperatures: Sequence[float],
+                       baselines: Optional[Baselines] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Score current temperatures against their cities' seasonal baselines.
+
+    Args:
+        cities (sequence): City names
+        temperatures (sequence): Current temperatures (°C), aligned with cities
+        baselines (Baselines): Baselines to use (default: the cached ones)
+
+    Returns:
+        tuple: (z-scores, baseline means) arrays; NaN where a city has fewer
+            than MIN_DAYS days of seasonal history
+    """
+    baselines = baselines or get_baselines()
+    positions = np.array([baselines.index.get(city, -1) for city in cities], dtype=int)
+    known = positions >= 0
+    if known.any():
+        known[known] = baselines.days[positions[known]] >= MIN_DAYS
+
+    mean = np.full(len(positions), np.nan)
+    std = np.full(len(positions), np.nan)
+    mean[known] = baselines.mean[positions[known]]
+    std[known] = np.fmax(baselines.std[positions[known]], MIN_STD)
+    return (np.asarray(temperatures, dtype=float) - mean) / std, mean
+
+
+def evaluate_alerts(observations: Iterable[Tuple[str, CurrentWeather]],
+                    baselines: Optional[Baselines] = None) -> Dict[str, List[str]]:
+    """
+    Generate alerts for a batch of current observations.
+
+    Args:
+        observations (iterable): (city, CurrentWeather) pairs, e.g. from refresh_cities();
+            error dicts are skipped
+        baselines (Baselines): Baselines to use (default: the cached ones)
+
+    Returns:
+        dict: City -> list of alert messages (empty if nothing is unusual)
+    """
+    observations = [(city, weather) for city, weather in observations if not is_error(weather)]
+    if not observations:
+        return {}
+
+    cities = [city for city, _ in observations]
+    z_scores, _ = score_temperatures(cities, [weather.temperature for _, weather in observations], baselines)
+
+    results = {}
+    for (city, weather), z_score in zip(observations, z_scores):
+        alerts = []
+
+        # Temperature anomalies relative to this time of year
+        if z_score > Z_THRESHOLD:
+            alerts.append(f"⚠️ ALERT: Current temperature is unusually high for {city} this time of year!")
+        elif z_score < -Z_THRESHOLD:
+            alerts.append(f"⚠️ ALERT: Current temperature is unusually low for {city} this time of year!")
+
+        # Check for severe weather conditions
+        current_condition = f"{weather.condition} {weather.description}".lower()
+        for condition in SEVERE_CONDITIONS:
+            if condition in current_condition:
+                alerts.append(f"🚨 SEVERE WEATHER ALERT: {condition.capitalize()} detected in {city}!")
+
+        # Add air quality alerts if available
+        if (weather.air_quality_index or 0) >= POOR_AIR_QUALITY_INDEX:
+            alerts.append(
+                f"😷 AIR QUALITY ALERT: Poor air quality detected in {city}. Consider limiting outdoor activities.")
+
+        results[city] = alerts
+    return results
+
+
+def get_weather_alerts(city: str, weather: CurrentWeather) -> List[str]:
+    """
+    Generate weather alerts for a single city.
+
+    Args:
+        city (str): City name
+        weather (CurrentWeather): Current weather of the city
+
+    Returns:
+        list: Alert messages
+    """
+    return evaluate_alerts([(city, weather)]).get(city, [])
+
+
+def refresh_alerts(cities: Optional[Iterable[str]] = None) -> Dict[str, List[str]]:
+    """
+    Refresh current weather for many cities and evaluate their alerts in one batch.
+
+    Args:
+        cities (iterable): City names (default: every user's favorite cities)
+
+    Returns:
+        dict: City -> list of alert messages
+    """
+    cities = get_all_favorite_cities() if cities is None else list(cities)
+    results = evaluate_alerts(refresh_cities(cities))
+    with _latest_lock:
+        _latest_alerts.update((normalize_city(city), alerts) for city, alerts in results.items())
+    return results
+
+
+def get_cached_alerts(cities: Iterable[str]) -> Dict[str, List[str]]:
+    """
+    Return the alerts stored by the last refresh, without fetching weather.
+
+    Args:
+        cities (iterable): City names
+
+    Returns:
+        dict: City -> list of alert messages (empty for cities not evaluated yet)
+    """
+    with _latest_lock:
+        return {city: _latest_alerts.get(normalize_city(city), []) for city in cities}
+
+
+class AlertRefresher:
+    """
+    Background thread that runs refresh_alerts() over every favorite city.
+
+    A refresh runs when the thread starts, every interval seconds after
+    that, and whenever wake() is called (e.g. after a favorite was added).
+    """
+
+    def __init__(self, interval: float = REFRESH_INTERVAL):
+        """
+        Args:
+            interval (float): Seconds between refreshes
+        """
+        self.interval = interval
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._thread = None
+
+    def start(self) -> None:
+        """Start the thread unless it is already running."""
+        with self._lock:
+            if self._thread is None and not self._closed:
+                self._thread = threading.Thread(target=self._run, name="weather-alert-refresher", daemon=True)
+                self._thread.start()
+
+    def wake(self) -> None:
+        """Refresh now instead of waiting for the next interval."""
+        self._wake.set()
+
+    def _run(self) -> None:
+        while not self._closed:
+            try:
+                refresh_alerts()
+            except Exception as e:
+                logger.error(f"Error refreshing weather alerts: {e}")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def close(self) -> None:
+        """Stop the thread after its current refresh."""
+        self._closed = True
+        self._wake.set()
+
+
+_refresher = AlertRefresher()
+atexit.register(_refresher.close)
+
+
+def start_alert_refresher() -> None:
+    """Start refreshing every favorite city's alerts in the background (idempotent)."""
+    _refresher.start()
+
+
+def request_alert_refresh() -> None:
+    """Ask the background refresher to run now, e.g. after favorites changed."""
+    _refresher.wake()
@@ -4,29 +4,36 @@ from dotenv import load_dotenv
 import plotly.express as px
 import pandas as pd
 import random
-from weather_service import get_weather, get_forecast
+import time
+from weather_service import CACHE_TTLS, get_city_report
+from models import format_date, format_percent, format_speed, format_temperature, format_time, is_error
+from alerts import get_weather_alerts, get_cached_alerts, clear_baselines, request_alert_refresh, start_alert_refresher
 from database import (
     init_db,
     save_weather_data,
-    get_or_create_user,
-    get_temperature_trends,
     add_test_historical_data,
     get_user_cities,
     add_user_city,
-    remove_user_city
-)
-from auth import (
-    init_auth_db,
-    authenticate,
-    register_user,
-    change_password,
-    get_user
+    remove_user_city,
+    MAX_FAVORITE_CITIES
 )
+from auth import init_auth_db
+from identity import resolve_identity, login, register, change_password
 
 # Load environment variables and initialize databases
 load_dotenv()
 init_db()
 init_auth_db()
+# Favorites' alerts are evaluated in the background; the sidebar only reads them
+start_alert_refresher()
+
+# st.rerun (1.27) and st.fragment (1.37) replaced their experimental_ names;
+# without fragment support, sections simply run as part of the whole script
+fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None) or (lambda func: func)
+rerun = getattr(st, "rerun", None) or st.experimental_rerun
+
+# Seconds the page reuses a city's weather and alerts across reruns
+SECTION_TTL = CACHE_TTLS["weather"]
 
 # Weather message collections
 RAIN_MESSAGES = [
@@ -100,45 +107,56 @@ def get_rotating_message(message_list):
     return random.choice(message_list)
 
 
-def get_weather_alerts(city, current_temp, current_condition, weather_data):
-    """Generate weather alerts based on temperature and historical data."""
-    # Get historical temperature data for comparison - use seasonal
-    historical_trends = get_temperature_trends(city, seasonal=True)
-
-    alerts = []
-
-    # Check if we have historical data to compare
-    if historical_trends:
-        # Calculate average historical temperature for this time of year
-        avg_historical_temp = sum(float(trend[2]) for trend in historical_trends) / len(historical_trends)
+def get_weather_user_id():
+    """Return the logged-in user's weather database id, looked up once per session."""
+    if st.session_state.weather_user_id is None:
+        identity = resolve_identity(st.session_state.username)
+        st.session_state.weather_user_id = identity['user_id'] if identity else None
+    return st.session_state.weather_user_id
 
-        # Check for temperature anomalies (5°C difference as threshold)
-        if current_temp > avg_historical_temp + 5:
-            alerts.append(f"⚠️ ALERT: Current temperature is unusually high for {city} this time of year!")
-        elif current_temp < avg_historical_temp - 5:
-            alerts.append(f"⚠️ ALERT: Current temperature is unusually low for {city} this time of year!")
 
-    # Check for severe weather conditions
-    severe_conditions = ['thunderstorm', 'tornado', 'hurricane', 'blizzard', 'hail']
-    for condition in severe_conditions:
-        if condition in current_condition.lower():
-            alerts.append(f"🚨 SEVERE WEATHER ALERT: {condition.capitalize()} detected in {city}!")
-
-    # Add air quality alerts if available
-    if 'air_quality_index' in weather_data and weather_data['air_quality_index'] >= 4:
-        alerts.append(
-            f"😷 AIR QUALITY ALERT: Poor air quality detected in {city}. Consider limiting outdoor activities.")
+def load_city_section(city):
+    """
+    Return the selected city's report and alerts, reused across reruns.
 
-    return alerts
+    Weather is fetched (and saved for analytics) only when the city changes,
+    after SECTION_TTL seconds, or when the section was reset, so page reruns
+    triggered from the sidebar reuse it. Error reports, and weather served
+    stale or from the offline snapshot, are not kept, so the next rerun
+    retries instead of showing a transient failure or old data for SECTION_TTL.
+    """
+    section = st.session_state.city_section
+    if section is None or section["city"] != city or time.time() - section["loaded_at"] >= SECTION_TTL:
+        report = get_city_report(city)
+        weather = report["current"]
+        if is_error(weather):
+            st.session_state.city_section = None
+            return {"city": city, "loaded_at": time.time(), "report": report, "alerts": []}
+
+        save_weather_data(city, weather.temperature, weather.condition_label, weather.observed_at)
+        section = {"city": city, "loaded_at": time.time(), "report": report,
+                   "alerts": get_weather_alerts(city, weather)}
+        fresh = weather.stale_age is None and weather.offline_as_of is None
+        st.session_state.city_section = section if fresh else None
+    return section
+
+
+def remove_favorite(city):
+    """Button callback: remove a favorite before the sidebar is redrawn."""
+    if remove_user_city(get_weather_user_id(), city):
+        st.session_state.favorite_cities.remove(city)
+        st.session_state.favorite_message = f"Removed {city} from favorites"
+        # The main area offers "Add to Favorites" for the city on screen
+        st.session_state.favorites_changed = city == st.session_state.selected_city
 
 
 def generate_fun_forecast_message(forecast_data):
     """Generate fun messages based on weather forecast with rotation."""
     messages = []
     for day in forecast_data:
-        condition = day['condition'].lower()
-        temp = float(day['temperature'].replace('°C', ''))
-        date = day['date']
+        condition = day.condition
+        temp = day.temperature
+        date = format_date(day.date)
 
         if 'rain' in condition:
             message = get_rotating_message(RAIN_MESSAGES)
@@ -158,6 +176,76 @@ def generate_fun_forecast_message(forecast_data):
     return messages
 
 
+# Forecast rendering is memoized on the forecast records themselves (cache_data
+# hashes the tuple), so reruns with an unchanged forecast skip the DataFrame,
+# the Plotly figure and the card HTML entirely.
+@st.cache_data(max_entries=64, show_spinner=False)
+def build_forecast_figure(forecast_days):
+    """Build the temperature forecast chart for a tuple of ForecastDay records."""
+    forecast_df = pd.DataFrame({
+        'date': [format_date(day.date) for day in forecast_days],
+        'temperature': [day.temperature for day in forecast_days],
+        'condition': [day.condition_label.split()[-1] for day in forecast_days]
+    })
+
+    forecast_fig = px.line(
+        forecast_df,
+        x='date',
+        y='temperature',
+        markers=True
+    )
+
+    forecast_fig.update_layout(
+        xaxis_title="Date",
+        yaxis_title="Temperature (°C)",
+        hovermode='x unified',
+        showlegend=False,
+        height=400,
+        margin=dict(l=20, r=20, t=30, b=20),
+        title_text="Temperature Forecast",
+        title_x=0.5
+    )
+
+    # Weather conditions as one text trace rather than an annotation per point
+    forecast_fig.add_scatter(
+        x=forecast_df['date'],
+        y=forecast_df['temperature'],
+        text=forecast_df['condition'],
+        mode='text',
+        textposition='top center',
+        hoverinfo='skip'
+    )
+    return forecast_fig
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def build_forecast_cards(forecast_days):
+    """Render one HTML card per ForecastDay record."""
+    return [f"""
+        <div class="forecast-card">
+            <div class="forecast-date">{format_date(day.date)}</div>
+            <div class="forecast-temp">{format_temperature(day.temperature)}</div>
+            <div class="forecast-condition">{day.condition_label}</div>
+            <div class='forecast-data'>⬆️ {format_temperature(day.temp_max)} ⬇️ {format_temperature(day.temp_min)}</div>
+            <div class='forecast-data'>💧 {format_percent(day.humidity)}</div>
+            <div class='forecast-data'>💨 {format_speed(day.wind_speed)}</div>
+        </div>
+    """ for day in forecast_days]
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def build_hourly_cards(forecast_hours):
+    """Render one HTML card per ForecastHour record."""
+    return [f"""
+        <div class="forecast-card">
+            <div class="forecast-date">{format_time(hour.time)}</div>
+            <div class="forecast-temp">{format_temperature(hour.temperature)}</div>
+            <div class="forecast-condition">{hour.condition_label}</div>
+            <div class='forecast-data'>☔ {format_percent(hour.pop * 100)}</div>
+        </div>
+    """ for hour in forecast_hours]
+
+
 # Page configuration
 st.set_page_config(
     page_title="WeatherWise Pro",
@@ -293,19 +381,29 @@ if 'username' not in st.session_state:
     st.session_state.username = None
 if 'user_id' not in st.session_state:
     st.session_state.user_id = None
+if 'weather_user_id' not in st.session_state:
+    st.session_state.weather_user_id = None
 if 'favorite_cities' not in st.session_state:
     st.session_state.favorite_cities = []
 if 'registration_success' not in st.session_state:
     st.session_state.registration_success = False
 if 'favorite_message' not in st.session_state:
     st.session_state.favorite_message = None
+if 'favorites_changed' not in st.session_state:
+    st.session_state.favorites_changed = False
+if 'city_section' not in st.session_state:
+    st.session_state.city_section = None
 
 # Main title and description
 st.title("🌤️ WeatherWise Pro")
 st.write("Your Smart Weather Companion - Now with Extra Fun! 🌍")
 
-# Authentication in sidebar
-with st.sidebar:
+# Sidebar sections are fragments: using them reruns only that section, and
+# actions that change the main area (login, logout, picking a favorite) rerun
+# the page, which reuses the cached weather section
+@fragment
+def render_user_area():
+    """Login, registration and account tabs."""
     st.header("👤 User Area")
 
     # Place tabs for login/register/account
@@ -321,21 +419,19 @@ with st.sidebar:
 
                 if submit:
                     if username and password:
-                        auth_success, user_info = authenticate(username, password)
+                        identity = login(username, password)
 
-                        if auth_success:
+                        if identity:
                             st.session_state.authenticated = True
                             st.session_state.username = username
-                            st.session_state.user_id = user_info["id"]
+                            st.session_state.user_id = identity["auth_id"]
+                            st.session_state.weather_user_id = identity["user_id"]
 
-                            # Make sure this username exists in our weather database too
-                            weather_user = get_or_create_user(username)
-                            if weather_user:
-                                # Load favorite cities
-                                st.session_state.favorite_cities = get_user_cities(weather_user['id'])
+                            # Load favorite cities
+                            st.session_state.favorite_cities = get_user_cities(identity["user_id"])
 
                             st.success(f"Welcome back, {username}! 🎉")
-                            st.experimental_rerun()
+                            rerun()
                         else:
                             st.error("Username/password is incorrect")
         else:
@@ -344,8 +440,9 @@ with st.sidebar:
                 st.session_state.authenticated = False
                 st.session_state.username = None
                 st.session_state.user_id = None
+                st.session_state.weather_user_id = None
                 st.session_state.favorite_cities = []
-                st.experimental_rerun()
+                rerun()
 
     # Register tab
     with auth_tab2:
@@ -372,14 +469,12 @@ with st.sidebar:
                     elif not reg_username or not reg_name or not reg_password or not reg_email:
                         st.error("Please fill in all fields")
                     else:
-                        success, message = register_user(reg_username, reg_name, reg_password, reg_email)
+                        success, message = register(reg_username, reg_name, reg_password, reg_email)
                         if success:
-                            # Create user in database
-                            get_or_create_user(reg_username)
                             # Store success message in session state to display after rerun
                             st.session_state.registration_success = True
                             st.success("Registration successful! You can now login.")
-                            st.experimental_rerun()
+                            rerun()
                         else:
                             st.error(message)
         else:
@@ -388,7 +483,7 @@ with st.sidebar:
     # Account tab (only shown when logged in)
     with auth_tab3:
         if st.session_state.authenticated:
-            user_info = get_user(st.session_state.username)
+            user_info = resolve_identity(st.session_state.username)
 
             st.subheader("Account Information")
             st.write(f"Username: {st.session_state.username}")
@@ -422,13 +517,20 @@ with st.sidebar:
         else:
             st.info("Please login to view account information")
 
-    # Display favorite cities if logged in
+
+@fragment
+def render_favorites():
+    """The logged-in user's favorite cities with their alert badges."""
+    if st.session_state.favorites_changed:
+        st.session_state.favorites_changed = False
+        rerun()
+
     if st.session_state.authenticated:
         st.header("⭐ Favorite Cities")
 
         # Show the limit counter
         city_count = len(st.session_state.favorite_cities)
-        st.markdown(f"<div>You have saved <b>{city_count}/10</b> cities</div>", unsafe_allow_html=True)
+        st.markdown(f"<div>You have saved <b>{city_count}/{MAX_FAVORITE_CITIES}</b> cities</div>", unsafe_allow_html=True)
 
         # Show message if there's any
         if st.session_state.favorite_message:
@@ -438,21 +540,24 @@ with st.sidebar:
         if not st.session_state.favorite_cities:
             st.info("You haven't saved any favorite cities yet. Search for a city and add it to your favorites!")
         else:
+            # Alerts from the last background refresh; nothing is fetched here
+            favorite_alerts = get_cached_alerts(st.session_state.favorite_cities)
             for city in st.session_state.favorite_cities:
                 col1, col2 = st.columns([5, 1])
 
                 with col1:
-                    if st.button(f"🌆 {city}", key=f"fav_{city}"):
+                    badge = " ⚠️" if favorite_alerts.get(city) else ""
+                    if st.button(f"🌆 {city}{badge}", key=f"fav_{city}", help="\n".join(favorite_alerts.get(city, [])) or None):
                         st.session_state.selected_city = city
-                        st.experimental_rerun()
+                        rerun()
 
                 with col2:
-                    if st.button("❌", key=f"remove_{city}"):
-                        weather_user = get_or_create_user(st.session_state.username)
-                        if remove_user_city(weather_user['id'], city):
-                            st.session_state.favorite_cities.remove(city)
-                            st.session_state.favorite_message = f"Removed {city} from favorites"
-                            st.experimental_rerun()
+                    st.button("❌", key=f"remove_{city}", on_click=remove_favorite, args=(city,))
+
+
+with st.sidebar:
+    render_user_area()
+    render_favorites()
 
 
 # City Selection in main area
@@ -479,6 +584,8 @@ with col2:
             city_input_container.error("🚫 Please enter a city name")
         else:
             st.session_state.selected_city = selected_city
+            # An explicit lookup always fetches fresh weather
+            st.session_state.city_section = None
 
 # Optional: Add this CSS styling
 st.markdown("""
@@ -520,42 +627,51 @@ st.markdown("""
 # Get selected city from session state
 selected_city = st.session_state.selected_city
 if selected_city:
-    weather_data = get_weather(selected_city)
-    forecast_data = get_forecast(selected_city)
+    # Current weather, forecast and air quality are fetched concurrently, and
+    # reused by reruns that do not change the city
+    section = load_city_section(selected_city)
+    report = section["report"]
+    weather_data = report["current"]
+    forecast_data = report["forecast"]
+    hourly_data = report["hourly"]
 
     # First check if the city was found
-    if "error" in weather_data:
+    if is_error(weather_data):
         st.error(f"🚫 {weather_data['error']}")
     else:
         # City was found, now show favorites button (only for logged in users)
         if st.session_state.authenticated:
-            weather_user = get_or_create_user(st.session_state.username)
-
             if selected_city not in st.session_state.favorite_cities:
                 if st.button(f"⭐ Add {selected_city} to Favorites"):
-                    success, message = add_user_city(weather_user['id'], selected_city)
+                    success, message = add_user_city(get_weather_user_id(), selected_city)
                     if success:
                 # City was successfully added
                         st.session_state.favorite_cities.append(selected_city)
+                        request_alert_refresh()
                         st.success(f"Added {selected_city} to favorites!")
                 # Store success message but don't show "already in favorites" message
                         if "already in favorites" not in message:
                             st.session_state.favorite_message = f"Added {selected_city} to favorites!"
-                        st.experimental_rerun()
+                        rerun()
                     else:
                 # City could not be added
                         st.error(f"Could not add {selected_city} to favorites: {message}")
             
         # Current Weather Display with better styling
         st.markdown(f"## Weather for {selected_city.title()}")
+        if weather_data.offline_as_of is not None:
+            st.warning("📴 Weather service unreachable - showing last known data from "
+                       f"{format_time(weather_data.offline_as_of, '%Y-%m-%d %H:%M')}")
+        elif weather_data.stale_age is not None:
+            st.caption(f"⏳ Showing weather from {weather_data.stale_age // 60} minutes ago while it refreshes")
         st.markdown("### Current Weather")
         cols = st.columns([1, 1, 1, 1])
 
         metrics = [
-            ("Temperature", weather_data["temperature"], "🌡️"),
-            ("Humidity", weather_data["humidity"], "💧"),
-            ("Wind Speed", weather_data["wind_speed"], "💨"),
-            ("Condition", weather_data["condition"], "☁️")
+            ("Temperature", format_temperature(weather_data.temperature), "🌡️"),
+            ("Humidity", format_percent(weather_data.humidity), "💧"),
+            ("Wind Speed", format_speed(weather_data.wind_speed), "💨"),
+            ("Condition", weather_data.condition_label, "☁️")
         ]
 
         for col, (label, value, icon) in zip(cols, metrics):
@@ -567,12 +683,9 @@ if selected_city:
                     </div>
                 """, unsafe_allow_html=True)
 
-        # Save data for analytics
-        temp_value = float(weather_data["temperature"].replace("°C", ""))
-        save_weather_data(selected_city, temp_value, weather_data["condition"])
-
-        # Generate and display weather alerts
-        alerts = get_weather_alerts(selected_city, temp_value, weather_data["condition"], weather_data)
+        # Weather alerts (data for analytics was saved when the section was loaded)
+        temp_value = weather_data.temperature
+        alerts = section["alerts"]
 
         # Display alerts if any exist
         if alerts:
@@ -585,67 +698,32 @@ if selected_city:
         with col2:
             if st.button("Add Test Data", key="add_test_data"):
                 if add_test_historical_data(selected_city, temp_value):
+                    clear_baselines()
+                    section["alerts"] = get_weather_alerts(selected_city, weather_data)
                     st.success("Test data added successfully!")
                 else:
                     st.error("Failed to add test data")
 
+        # Hourly breakdown, from the same cached forecast as the daily view
+        if isinstance(hourly_data, list) and hourly_data:
+            st.markdown("### 🕒 Next 24 Hours")
+            for card, col in zip(build_hourly_cards(tuple(hourly_data)), st.columns(len(hourly_data))):
+                with col:
+                    st.markdown(card, unsafe_allow_html=True)
+
         # Forecast Plot
         st.markdown("### 📊 7-Day Forecast")
         if isinstance(forecast_data, list) and forecast_data:
-            forecast_df = pd.DataFrame([
-                {
-                    'date': day['date'],
-                    'temperature': float(day['temperature'].replace('°C', '')),
-                    'condition': day['condition']
-                }
-                for day in forecast_data
-            ])
-
-            forecast_fig = px.line(
-                forecast_df,
-                x='date',
-                y='temperature',
-                markers=True
-            )
-
-            forecast_fig.update_layout(
-                xaxis_title="Date",
-                yaxis_title="Temperature (°C)",
-                hovermode='x unified',
-                showlegend=False,
-                height=400,
-                margin=dict(l=20, r=20, t=30, b=20),
-                title_text="Temperature Forecast",
-                title_x=0.5
-            )
-
-            # Add weather conditions as annotations
-            for idx, row in forecast_df.iterrows():
-                forecast_fig.add_annotation(
-                    x=row['date'],
-                    y=row['temperature'],
-                    text=row['condition'].split()[-1],
-                    showarrow=False,
-                    yshift=10
-                )
-
-            st.plotly_chart(forecast_fig, use_container_width=True)
+            forecast_days = tuple(forecast_data)
+            st.plotly_chart(build_forecast_figure(forecast_days), use_container_width=True)
 
             # Weekly Forecast Details
             st.markdown("### 📅 Weekly Forecast")
             forecast_cols = st.columns(min(len(forecast_data), 7))
 
-            for day, col in zip(forecast_data, forecast_cols):
+            for card, col in zip(build_forecast_cards(forecast_days), forecast_cols):
                 with col:
-                    st.markdown(f"""
-                        <div class="forecast-card">
-                            <div class="forecast-date">{day['date']}</div>
-                            <div class="forecast-temp">{day['temperature']}</div>
-                            <div class="forecast-condition">{day['condition']}</div>
-                            {f"<div class='forecast-data'>💧 {day['humidity']}</div>" if 'humidity' in day else ""}
-                            {f"<div class='forecast-data'>💨 {day['wind_speed']}</div>" if 'wind_speed' in day else ""}
-                        </div>
-                    """, unsafe_allow_html=True)
+                    st.markdown(card, unsafe_allow_html=True)
 
             # Fun weather insights
             st.markdown("### 🎯 Weather Insights")
@@ -655,8 +733,8 @@ if selected_city:
 
             # Weather Tips
             st.markdown("### 💡 Weather Tips")
-            current_condition = weather_data["condition"].lower()
-            current_temp = float(weather_data["temperature"].replace("°C", ""))
+            current_condition = f"{weather_data.condition} {weather_data.description}".lower()
+            current_temp = weather_data.temperature
 
             if 'rain' in current_condition:
                 st.warning("🌂 Don't forget your umbrella!")
@@ -0,0 +1,328 @@
+import asyncio
+import os
+import time
+import logging
+from typing import Dict, List, Optional, Tuple, Union
+
+import aiohttp
+
+from circuit_breaker import CircuitOpenError
+from http_client import (
+    MAX_RETRIES,
+    REQUEST_TIMEOUT,
+    RETRY_STATUSES,
+    BACKOFF_BASE,
+    BACKOFF_MAX,
+    backoff_delay,
+    retry_after_delay,
+    get_client
+)
+import weather_service
+from forecast_aggregation import Forecast
+from models import AirQuality, CurrentWeather, ForecastDay
+from weather_service import (
+    resolve_city,
+    coord_key,
+    _caches,
+    _flights,
+    _location_key,
+    _apply_location,
+    _finish_weather,
+    _weather_params,
+    _forecast_params,
+    _air_quality_params,
+    _weather_status_error,
+    _parse_weather,
+    _parse_forecast,
+    _parse_air_quality,
+    _remember_forecast_location,
+    _daily_view,
+    _serve_cached,
+    _stale_age,
+    _store_snapshot,
+    _warm_from_snapshot,
+    _offline_fallback
+)
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Maximum number of requests in flight at once per client
+CONCURRENCY_LIMIT = int(os.getenv('OPENWEATHER_ASYNC_CONCURRENCY', 20))
+
+
+class AsyncWeatherClient:
+    """
+    asyncio counterpart of the weather_service fetch functions.
+
+    Responses are parsed by the same helpers and stored in the same caches as
+    the synchronous path, and errors come back as the same {"error": ...}
+    dictionaries. A semaphore bounds the number of requests in flight per
+    client. Requests are coalesced through weather_service's flight group, so
+    concurrent callers asking for the same city share one request, whether
+    they are tasks (on any client or event loop) or synchronous threads.
+    Stale entries are served and refreshed, and cold caches warmed from
+    snapshots, by the same helpers as well.
+
+    Usage:
+        async with AsyncWeatherClient(concurrency=50) as client:
+            results = await asyncio.gather(*(client.get_weather(c) for c in cities))
+    """
+
+    def __init__(self, concurrency: int = CONCURRENCY_LIMIT, max_retries: int = MAX_RETRIES,
+                 timeout: float = REQUEST_TIMEOUT, backoff_base: float = BACKOFF_BASE,
+                 backoff_max: float = BACKOFF_MAX):
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._session = None
+        self._semaphore = None
+
+    async def __aenter__(self) -> "AsyncWeatherClient":
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+
+    async def open(self) -> None:
+        """Create the HTTP session; must be called from the event loop that will use it."""
+        if self._session is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.concurrency),
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+
+    async def close(self) -> None:
+        """Close the HTTP session and its pooled connections."""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _get_json(self, url: str, params: Dict, endpoint: str,
+                        passthrough: Tuple[int, ...] = ()) -> Tuple[int, Optional[Dict]]:
+        """
+        GET url and decode the JSON body, retrying 429/5xx and connection errors.
+
+        Timeouts are not retried, so the session's total timeout bounds each call.
+
+        Args:
+            url (str): Request URL
+            params (dict): Query parameters
+            endpoint (str): Label used for latency statistics
+            passthrough (tuple): Error statuses returned to the caller instead of raised
+
+        Returns:
+            tuple: (status code, decoded body or None for passthrough statuses)
+
+        Raises:
+            CircuitOpenError: If the endpoint's circuit is open
+            aiohttp.ClientError: For other error statuses or a final connection failure
+            asyncio.TimeoutError: If the request does not finish within the timeout
+        """
+        await self.open()
+        attempt_log = get_client().attempt_log
+        breaker = get_client().breakers.get(endpoint)
+
+        for attempt in range(self.max_retries + 1):
+            breaker.check()
+            try:
+                async with self._semaphore:
+                    start = time.perf_counter()
+                    async with self._session.get(url, params=params) as response:
+                        attempt_log.record(endpoint, attempt, response.status, start)
+                        if response.status in RETRY_STATUSES:
+                            breaker.record_failure()
+                        else:
+                            breaker.record_success(time.perf_counter() - start)
+
+                        if response.status in RETRY_STATUSES and attempt < self.max_retries:
+                            delay = retry_after_delay(response.headers, self.backoff_max)
+                        elif response.status in passthrough:
+                            return response.status, None
+                        else:
+                            response.raise_for_status()
+                            return response.status, await response.json(content_type=None)
+            except asyncio.TimeoutError as e:
+                attempt_log.record(endpoint, attempt, None, start, type(e).__name__)
+                breaker.record_failure()
+                raise
+            except aiohttp.ClientConnectionError as e:
+                attempt_log.record(endpoint, attempt, None, start, type(e).__name__)
+                breaker.record_failure()
+                if attempt == self.max_retries:
+                    raise
+                delay = None
+
+            if delay is None:
+                delay = backoff_delay(attempt, self.backoff_base, self.backoff_max)
+            logger.warning(f"{endpoint} request failed, retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+    async def get_weather(self, city: str) -> Union[CurrentWeather, Dict[str, str]]:
+        """
+        Fetch detailed current weather data for a given city.
+
+        Args:
+            city (str): Name of the city
+
+        Returns:
+            CurrentWeather: As weather_service.get_weather
+        """
+        # Geocode lookups and writes touch SQLite, so keep them off the event loop
+        location = await asyncio.to_thread(resolve_city, city)
+        cache_key = _location_key(city, location)
+        # A stale entry is refreshed on the synchronous worker pool, which
+        # outlives this client's session
+        cached = _serve_cached("weather", cache_key, weather_service._load_weather, city, location)
+        if cached is not None:
+            logger.info(f"Using cached weather data for {city}")
+            return cached
+
+        return await _flights.do_async(("weather", cache_key), self._load_weather, city, location)
+
+    async def _load_weather(self, city: str, location: Optional[Dict]) -> Union[CurrentWeather, Dict[str, str]]:
+        """Fetch current weather plus air quality and cache the merged result."""
+        restored = await asyncio.to_thread(_warm_from_snapshot, "weather", _location_key(city, location))
+        if restored is not None:
+            return restored
+
+        try:
+            logger.info(f"Fetching weather data for {city}")
+            status, data = await self._get_json(weather_service.BASE_URL, _weather_params(city, location),
+                                                "weather", passthrough=(401, 404))
+            status_error = _weather_status_error(status, city)
+            if status_error:
+                return status_error
+
+            weather_info, coord = _parse_weather(data)
+            weather_info, location = await asyncio.to_thread(_apply_location, city, location, weather_info, data, coord)
+
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            logger.error(f"Connection error fetching weather data for {city}")
+            error = {"error": "Connection error. Please check your internet."}
+            return await asyncio.to_thread(_offline_fallback, "weather", _location_key(city, location), error)
+        except (aiohttp.ClientError, CircuitOpenError) as e:
+            logger.error(f"Error fetching weather data for {city}: {str(e)}")
+            error = {"error": f"Error fetching weather data: {str(e)}"}
+            return await asyncio.to_thread(_offline_fallback, "weather", _location_key(city, location), error)
+        except (KeyError, ValueError) as e:
+            logger.error(f"Error processing weather data for {city}: {str(e)}")
+            return {"error": f"Error processing weather data: {str(e)}"}
+
+        # Add air quality data if available
+        air_quality = await self.get_air_quality(location["lat"], location["lon"])
+        logger.info(f"Successfully retrieved weather data for {city}")
+        return _finish_weather(_location_key(city, location), weather_info, air_quality)
+
+    async def get_forecast(self, city: str, days: int = 7) -> Union[List[ForecastDay], Dict[str, str]]:
+        """
+        Fetch detailed weather forecast for specified number of days.
+
+        Args:
+            city (str): Name of the city
+            days (int): Number of days for forecast (default 7)
+
+        Returns:
+            list: As weather_service.get_forecast
+        """
+        location = await asyncio.to_thread(resolve_city, city)
+        cache_key = (_location_key(city, location), days)
+        entry = _caches["forecast"].lookup(cache_key)
+        if entry is not None:
+            forecast, age = entry
+            logger.info(f"Using cached forecast for {city}")
+            _stale_age("forecast", ("forecast",) + cache_key, age, weather_service._load_forecast, city, days, location)
+            return forecast.daily()
+
+        return _daily_view(await _flights.do_async(("forecast",) + cache_key, self._load_forecast, city, days, location))
+
+    async def _load_forecast(self, city: str, days: int,
+                             location: Optional[Dict]) -> Union[Forecast, Dict[str, str]]:
+        """Fetch, parse and cache a forecast (the raw entries, as the synchronous path does)."""
+        restored = await asyncio.to_thread(_warm_from_snapshot, "forecast", (_location_key(city, location), days))
+        if restored is not None:
+            return restored
+
+        try:
+            logger.info(f"Fetching {days}-day forecast for {city}")
+            _, data = await self._get_json(weather_service.FORECAST_URL, _forecast_params(city, days, location),
+                                           "forecast")
+
+            location = location or await asyncio.to_thread(_remember_forecast_location, city, data)
+            forecast = _parse_forecast(data)
+
+            cache_key = (_location_key(city, location), days)
+            _caches["forecast"].set(cache_key, forecast)
+            _store_snapshot("forecast", cache_key, forecast)
+            logger.info(f"Successfully retrieved forecast data for {city}")
+            return forecast
+
+        except (aiohttp.ClientError, asyncio.TimeoutError, CircuitOpenError) as e:
+            logger.error(f"Error fetching forecast for {city}: {str(e)}")
+            error = {"error": f"Error fetching forecast data: {str(e)}"}
+            return await asyncio.to_thread(_offline_fallback, "forecast", (_location_key(city, location), days), error)
+        except (KeyError, ValueError) as e:
+            logger.error(f"Error processing forecast for {city}: {str(e)}")
+            return {"error": f"Error processing forecast data: {str(e)}"}
+
+    async def get_air_quality(self, lat: float, lon: float) -> Optional[AirQuality]:
+        """
+        Fetch air quality data for given coordinates.
+
+        Args:
+            lat (float): Latitude
+            lon (float): Longitude
+
+        Returns:
+            AirQuality: As weather_service.get_air_quality
+        """
+        cache_key = coord_key(lat, lon)
+        cached = _caches["air_quality"].get(cache_key)
+        if cached is not None:
+            return cached
+
+        return await _flights.do_async(("air_quality", cache_key), self._load_air_quality, lat, lon, cache_key)
+
+    async def _load_air_quality(self, lat: float, lon: float,
+                                cache_key: Tuple[float, float]) -> Optional[AirQuality]:
+        """Fetch, parse and cache air quality data."""
+        restored = await asyncio.to_thread(_warm_from_snapshot, "air_quality", cache_key)
+        if restored is not None:
+            return restored
+
+        try:
+            _, data = await self._get_json(weather_service.AIR_QUALITY_URL, _air_quality_params(lat, lon),
+                                           "air_quality")
+            air_quality = _parse_air_quality(data)
+            _caches["air_quality"].set(cache_key, air_quality)
+            _store_snapshot("air_quality", cache_key, air_quality)
+            return air_quality
+        except Exception:
+            logger.warning("Could not fetch air quality data")
+            return await asyncio.to_thread(_offline_fallback, "air_quality", cache_key, None)
+
+
+async def get_weather(city: str) -> Union[CurrentWeather, Dict[str, str]]:
+    """One-off async get_weather; use AsyncWeatherClient directly for batches."""
+    async with AsyncWeatherClient() as client:
+        return await client.get_weather(city)
+
+
+async def get_forecast(city: str, days: int = 7) -> Union[List[ForecastDay], Dict[str, str]]:
+    """One-off async get_forecast; use AsyncWeatherClient directly for batches."""
+    async with AsyncWeatherClient() as client:
+        return await client.get_forecast(city, days)
+
+
+async def get_air_quality(lat: float, lon: float) -> Optional[AirQuality]:
+    """One-off async get_air_quality; use AsyncWeatherClient directly for batches."""
+    async with AsyncWeatherClient() as client:
+        return await client.get_air_quality(lat, lon)
@@ -1,8 +1,9 @@
 import os
-import sqlite3
 import hashlib
 import logging
 
+import db_pool
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -17,7 +18,7 @@ AUTH_DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'auth.db
 def init_auth_db():
     """Initialize the authentication database."""
     try:
-        conn = sqlite3.connect(AUTH_DB_FILE)
+        conn = db_pool.connect(AUTH_DB_FILE)
         cursor = conn.cursor()
 
         # Create users table if it doesn't exist
@@ -46,7 +47,7 @@ def init_auth_db():
 def get_user(username):
     """Get user details from database."""
     try:
-        conn = sqlite3.connect(AUTH_DB_FILE)
+        conn = db_pool.connect(AUTH_DB_FILE)
         cursor = conn.cursor()
 
         cursor.execute("SELECT id, username, password, name, email FROM users WHERE username = ?", (username,))
@@ -83,7 +84,7 @@ def register_user(username, name, password, email):
         return False, "Username already exists"
 
     try:
-        conn = sqlite3.connect(AUTH_DB_FILE)
+        conn = db_pool.connect(AUTH_DB_FILE)
         cursor = conn.cursor()
 
         hashed_password = hashlib.sha256(password.encode()).hexdigest()
@@ -111,7 +112,7 @@ def change_password(username, current_password, new_password):
         return False, "Current password is incorrect"
 
     try:
-        conn = sqlite3.connect(AUTH_DB_FILE)
+        conn = db_pool.connect(AUTH_DB_FILE)
         cursor = conn.cursor()
 
         hashed_password = hashlib.sha256(new_password.encode()).hexdigest()
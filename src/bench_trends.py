@@ -0,0 +1,79 @@
+"""
+Benchmark get_temperature_trends against a large synthetic weather_history.
+
+Raw rows are bulk-loaded into the monthly history partitions and folded into
+the weather_daily rollup that the trend queries read.
+
+Usage:
+    python bench_trends.py [--rows 10000000] [--cities 50] [--repeat 20]
+
+The data is written to a temporary database, so weatherwise.db is untouched.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import database
+
+CONDITIONS = ["Clear", "Clouds", "Rain", "Snow", "Mist"]
+
+
+def populate(rows, cities, batch_size=100000):
+    """Insert rows hourly readings spread evenly over cities, ending now."""
+    per_city = rows // cities
+    now = datetime.now().replace(minute=0, second=0, microsecond=0)
+    for city_index in range(cities):
+        city = f"City {city_index}"
+        batch = []
+        for hour in range(per_city):
+            recorded_at = now - timedelta(hours=hour)
+            batch.append((city, round(random.uniform(-10, 35), 1), random.choice(CONDITIONS),
+                          recorded_at.strftime('%Y-%m-%d %H:%M:%S'), None))
+            if len(batch) >= batch_size:
+                database.import_weather_history(batch)
+                batch = []
+        if batch:
+            database.import_weather_history(batch)
+
+
+def time_call(repeat, fn, *args):
+    """Return (median seconds, result) of repeat calls."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        timings.append(time.perf_counter() - start)
+    return sorted(timings)[len(timings) // 2], result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10000000)
+    parser.add_argument("--cities", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    database.DB_FILE = os.path.join(tempfile.mkdtemp(), "bench.db")
+    database.init_db()
+
+    start = time.perf_counter()
+    populate(args.rows, args.cities)
+    print(f"Inserted and folded {args.rows:,} rows for {args.cities} cities in {time.perf_counter() - start:.1f}s")
+
+    conn = database.connect_db()
+    plan = conn.execute("EXPLAIN QUERY PLAN SELECT * FROM weather_daily "
+                        "WHERE city = ? AND date >= ? AND date < ?",
+                        ("City 0", "2020-01-01", "2020-02-01")).fetchall()
+    conn.close()
+    print("Query plan:", "; ".join(row[-1] for row in plan))
+
+    for label, seasonal in (("seasonal", True), ("last 7 days", False)):
+        median, trends = time_call(args.repeat, database.get_temperature_trends, "City 0", 7, seasonal)
+        print(f"{label:>12}: {median * 1000:.2f} ms median over {args.repeat} runs ({len(trends)} days)")
+
+
+if __name__ == "__main__":
+    main()
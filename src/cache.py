@@ -0,0 +1,222 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries expire after a fixed time-to-live.
+
+    With max_stale > 0, expired entries are kept for that many extra seconds
+    so lookup() can still serve them (flagged by their age) while the caller
+    refreshes them.
+    """
+
+    def __init__(self, ttl: float, max_entries: int = 256, max_stale: float = 0):
+        """
+        Args:
+            ttl (float): Seconds an entry stays valid after it is stored
+            max_entries (int): Maximum number of entries before the least
+                recently used one is evicted
+            max_stale (float): Seconds past ttl an entry may still be served stale
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_stale = max_stale
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value for key, or None if it is missing or expired."""
+        entry = self.lookup(key, allow_stale=False)
+        return entry[0] if entry is not None else None
+
+    def lookup(self, key: Hashable, allow_stale: bool = True) -> Optional[Tuple[Any, float]]:
+        """
+        Return (value, age in seconds) for key, including stale entries within max_stale.
+
+        Callers compare the age with ttl to tell fresh entries from stale ones.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, stored_at = entry
+            age = now - stored_at
+            if age >= self.ttl:
+                if age >= self.ttl + self.max_stale:
+                    del self._entries[key]
+                    self.misses += 1
+                    return None
+                if not allow_stale:
+                    self.misses += 1
+                    return None
+                self.stale_hits += 1
+            else:
+                self.hits += 1
+
+            self._entries.move_to_end(key)
+            return value, age
+
+    def set(self, key: Hashable, value: Any, age: float = 0.0) -> None:
+        """
+        Store value under key, evicting the least recently used entries if full.
+
+        Args:
+            key: Cache key
+            value: Value to store
+            age (float): Seconds the value is already old, e.g. when restored from disk
+        """
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() - age)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        """Drop the entry for key, if any."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Drop every entry and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.stale_hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return size, configuration and hit/miss counters."""
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "max_stale": self.max_stale,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+
+# Result of a call whose task was cancelled; its waiters run the call again
+_ABANDONED = object()
+
+
+class SingleFlight:
+    """
+    Collapse concurrent calls for the same key into one execution.
+
+    The first caller for a key runs the function; callers that ask for the
+    same key while it is running wait for it and receive the same result (or
+    exception) instead of issuing their own request. Threads use do() and
+    asyncio tasks use do_async() on the same instance, so a thread and a task
+    (on any event loop) asking for the same key also share one execution.
+    If the task running a call is cancelled (e.g. its event loop shuts down),
+    the callers waiting on it start a new execution instead of failing.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+        self.shared = 0
+
+    def _join(self, key: Hashable) -> Tuple[Future, bool]:
+        """Return the in-flight call for key, and whether this caller has to run it."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.shared += 1
+                return call, False
+            call = self._calls[key] = Future()
+            return call, True
+
+    def _finish(self, key: Hashable) -> None:
+        with self._lock:
+            del self._calls[key]
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Run fn(*args, **kwargs) unless a call for key is already in flight.
+
+        Args:
+            key: Identifies equivalent calls, e.g. ("weather", "london")
+            fn: Function to run when this caller is first
+
+        Returns:
+            The result of the single shared execution
+        """
+        while True:
+            call, leader = self._join(key)
+            if leader:
+                break
+            result = call.result()
+            if result is not _ABANDONED:
+                return result
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self._finish(key)
+            call.set_exception(e)
+            raise
+        self._finish(key)
+        call.set_result(result)
+        return result
+
+    async def do_async(self, key: Hashable, fn: Callable[..., Awaitable], *args, **kwargs) -> Any:
+        """
+        Await fn(*args, **kwargs) unless a call for key is already in flight.
+
+        The coroutine runs as its own task, so cancelling the caller that
+        started it does not cancel the call other callers are waiting on.
+
+        Args:
+            key: Identifies equivalent calls
+            fn: Coroutine function to run when this caller is first
+
+        Returns:
+            The result of the single shared execution
+        """
+        while True:
+            call, leader = self._join(key)
+            if leader:
+                self._start(key, call, fn, *args, **kwargs)
+
+            # Shield so one cancelled waiter does not cancel the shared call
+            result = await asyncio.shield(asyncio.wrap_future(call))
+            if result is not _ABANDONED:
+                return result
+
+    def _start(self, key: Hashable, call: Future, fn: Callable[..., Awaitable], *args, **kwargs) -> None:
+        """Run fn as a task on the running loop and settle call when it is done."""
+        task = asyncio.ensure_future(fn(*args, **kwargs))
+
+        def settle(task):
+            self._finish(key)
+            # The shared future is never cancelled: threads waiting on it
+            # would get CancelledError instead of a result
+            if task.cancelled():
+                call.set_result(_ABANDONED)
+            elif task.exception() is not None:
+                call.set_exception(task.exception())
+            else:
+                call.set_result(task.result())
+
+        task.add_done_callback(settle)
@@ -0,0 +1,186 @@
+import os
+import threading
+import time
+import logging
+from typing import Any, Dict, Optional
+
+import requests
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Breaker settings: consecutive failures before opening, seconds after which a
+# successful call still counts as a failure, and seconds to stay open
+FAILURE_THRESHOLD = int(os.getenv('OPENWEATHER_BREAKER_FAILURES', 5))
+SLOW_CALL_THRESHOLD = float(os.getenv('OPENWEATHER_BREAKER_SLOW_CALL', 5))
+RESET_TIMEOUT = float(os.getenv('OPENWEATHER_BREAKER_RESET', 30))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Raised instead of calling an endpoint whose circuit is open."""
+
+    def __init__(self, endpoint: str, retry_in: float):
+        super().__init__(f"{endpoint} service unavailable (circuit open, retry in {retry_in:.0f}s)")
+        self.endpoint = endpoint
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """
+    Thread-safe circuit breaker for one upstream endpoint.
+
+    Closed: calls go through; consecutive failures (errors or slow calls) are
+    counted and the circuit opens once they reach failure_threshold.
+    Open: calls are rejected immediately until reset_timeout has passed.
+    Half-open: a single probe call is let through; success closes the
+    circuit, failure opens it again.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = FAILURE_THRESHOLD,
+                 slow_call_threshold: Optional[float] = SLOW_CALL_THRESHOLD,
+                 reset_timeout: float = RESET_TIMEOUT):
+        """
+        Args:
+            name (str): Endpoint label
+            failure_threshold (int): Consecutive failures that open the circuit
+            slow_call_threshold (float): Seconds after which a call counts as
+                failed even if it succeeded (None to disable)
+            reset_timeout (float): Seconds the circuit stays open before a probe
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.slow_call_threshold = slow_call_threshold
+        self.reset_timeout = reset_timeout
+
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self.opens = 0
+        self.rejected = 0
+
+    def _retry_in(self, now: float) -> float:
+        return max(0.0, self._opened_at + self.reset_timeout - now)
+
+    def allow(self) -> bool:
+        """Return True if a call may proceed, moving open circuits to half-open when due."""
+        with self._lock:
+            if self._state == OPEN and self._retry_in(time.monotonic()) <= 0:
+                self._state = HALF_OPEN
+                self._probing = False
+                logger.info(f"Circuit for {self.name} half-open, probing")
+
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+
+            self.rejected += 1
+            return False
+
+    def check(self) -> None:
+        """
+        Raise CircuitOpenError unless a call may proceed.
+
+        Raises:
+            CircuitOpenError: If the circuit is open or a probe is already running
+        """
+        if not self.allow():
+            with self._lock:
+                retry_in = self._retry_in(time.monotonic())
+            raise CircuitOpenError(self.name, retry_in)
+
+    def record_success(self, latency: float = 0.0) -> None:
+        """Record a completed call; calls slower than slow_call_threshold count as failures."""
+        if self.slow_call_threshold is not None and latency >= self.slow_call_threshold:
+            logger.warning(f"Slow {self.name} call ({latency:.2f}s) counted as a failure")
+            self.record_failure()
+            return
+
+        with self._lock:
+            if self._state != CLOSED:
+                logger.info(f"Circuit for {self.name} closed")
+            self._state = CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self) -> None:
+        """Record a failed call, opening the circuit at the threshold or after a failed probe."""
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self._state == HALF_OPEN or (self._state == CLOSED and self._failures >= self.failure_threshold):
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self.opens += 1
+                logger.warning(f"Circuit for {self.name} opened after {self._failures} failures")
+
+    def reset(self) -> None:
+        """Force the circuit closed and clear its failure count."""
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._probing = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and self._retry_in(time.monotonic()) <= 0:
+                return HALF_OPEN
+            return self._state
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return the state, failure count and counters for health reporting."""
+        state = self.state
+        with self._lock:
+            return {
+                "state": state,
+                "consecutive_failures": self._failures,
+                "retry_in": round(self._retry_in(time.monotonic()), 1) if state == OPEN else 0.0,
+                "opens": self.opens,
+                "rejected": self.rejected
+            }
+
+
+class CircuitBreakerRegistry:
+    """Per-endpoint circuit breakers sharing one configuration."""
+
+    def __init__(self, **settings):
+        """
+        Args:
+            **settings: Keyword arguments for each CircuitBreaker
+        """
+        self._settings = settings
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, endpoint: str) -> CircuitBreaker:
+        """Return the breaker for endpoint, creating it on first use."""
+        with self._lock:
+            breaker = self._breakers.get(endpoint)
+            if breaker is None:
+                breaker = self._breakers[endpoint] = CircuitBreaker(endpoint, **self._settings)
+            return breaker
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Return the snapshot of every breaker by endpoint."""
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {breaker.name: breaker.snapshot() for breaker in breakers}
+
+    def reset(self) -> None:
+        """Close every circuit."""
+        with self._lock:
+            breakers = list(self._breakers.values())
+        for breaker in breakers:
+            breaker.reset()
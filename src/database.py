@@ -1,9 +1,15 @@
-import sqlite3
 import os
-from datetime import datetime, timedelta
+import time
+import atexit
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
 import uuid
 import logging
 
+import db_pool
+import history_partitions
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -14,16 +20,50 @@ logger = logging.getLogger(__name__)
 # Database file path
 DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'weatherwise.db')
 
+# Weather history write buffering: rows per batch, seconds between flushes,
+# and rows kept in memory while the database is unavailable
+HISTORY_FLUSH_SIZE = int(os.getenv('HISTORY_FLUSH_SIZE', 100))
+HISTORY_FLUSH_INTERVAL = float(os.getenv('HISTORY_FLUSH_INTERVAL', 5))
+HISTORY_MAX_PENDING = int(os.getenv('HISTORY_MAX_PENDING', 10000))
+# At most one weather_history row per city per this many seconds of observation time
+HISTORY_OBSERVATION_INTERVAL = int(os.getenv('HISTORY_OBSERVATION_INTERVAL', 600))
+# Cities whose last observation bucket is remembered for deduplication; beyond
+# this the least recently saved are forgotten (the table's unique key still applies)
+HISTORY_MAX_CITIES = int(os.getenv('HISTORY_MAX_CITIES', 4096))
+# Days of raw history kept in SQLite; history_archive.compact_history() archives beyond it
+HOT_DAYS = int(os.getenv('WEATHER_HOT_DAYS', 90))
+
+# Favorite cities a user can save
+MAX_FAVORITE_CITIES = 10
+
 
 def connect_db():
-    """Establish a connection to the SQLite database."""
+    """Check out a pooled connection to the SQLite database; close() returns it to the pool."""
     try:
-        return sqlite3.connect(DB_FILE)
+        return db_pool.connect(DB_FILE)
     except Exception as e:
         logger.error(f"Database connection error: {e}")
         return None
 
 
+def _enable_incremental_vacuum(conn):
+    """Switch a file created without auto_vacuum to INCREMENTAL mode.
+
+    The pragma only applies to an empty file or through a VACUUM, which
+    rebuilds the whole database; it runs once, outside any transaction.
+    Without it, "PRAGMA incremental_vacuum" is a no-op and the file never shrinks.
+    """
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 0:
+        return
+    try:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+        logger.info("Enabled incremental auto-vacuum")
+    except Exception as e:
+        # Retried on the next start; the database works without it
+        logger.warning(f"Could not enable incremental auto-vacuum: {e}")
+
+
 def init_db():
     """Initialize database with all required tables."""
     conn = connect_db()
@@ -43,14 +83,28 @@ def init_db():
             )
         ''')
 
-        # Weather history table
+        # Daily rollup of weather history, maintained incrementally by _fold_weather_history
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS weather_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
+            CREATE TABLE IF NOT EXISTS weather_daily (
                 city TEXT NOT NULL,
-                temperature FLOAT NOT NULL,
-                condition TEXT NOT NULL,
-                recorded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                date TEXT NOT NULL,
+                readings INTEGER NOT NULL,
+                temp_sum FLOAT NOT NULL,
+                temp_min FLOAT NOT NULL,
+                temp_max FLOAT NOT NULL,
+                conditions TEXT NOT NULL,
+                PRIMARY KEY (city, date)
+            )
+        ''')
+
+        # Seasonal baselines scan one date window per year across all cities
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_weather_daily_date ON weather_daily (date)")
+
+        # Last id folded into weather_daily, per history partition
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS rollup_state (
+                name TEXT PRIMARY KEY,
+                last_id INTEGER NOT NULL
             )
         ''')
 
@@ -66,7 +120,49 @@ def init_db():
             )
         ''')
 
+        # Geocode cache: normalized city query -> canonical name and coordinates
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS city_locations (
+                query TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                country TEXT,
+                lat FLOAT NOT NULL,
+                lon FLOAT NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        # Last known good API responses, served when the weather service is offline
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS weather_snapshots (
+                kind TEXT NOT NULL,
+                key TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                fetched_at FLOAT NOT NULL,
+                PRIMARY KEY (kind, key)
+            )
+        ''')
+
+        # Weather history lives in monthly partitions behind a weather_history view
+        history_partitions.begin(cursor)
+        if history_partitions.has_legacy_table(cursor):
+            # Fold what the old table still holds, then move it into partitions
+            _fold_table(cursor, "weather_history", "weather_daily")
+            for partition in history_partitions.migrate_legacy_table(cursor):
+                cursor.execute(f"SELECT max(id) FROM {partition}")
+                _set_fold_watermark(cursor, partition, cursor.fetchone()[0])
+            cursor.execute("DELETE FROM rollup_state WHERE name = 'weather_daily'")
+            logger.info("Moved weather history into monthly partitions")
+        else:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'view' AND name = 'weather_history'")
+            if not cursor.fetchone():
+                history_partitions.refresh_view(cursor)
+
+        # Backfill the rollup with rows written before it existed
+        _fold_weather_history(cursor)
+
         conn.commit()
+        _enable_incremental_vacuum(conn)
         logger.info("Database initialized successfully")
         return True
 
@@ -97,14 +193,16 @@ def get_or_create_user(username):
             user_id, unique_id = user
             logger.info(f"Found existing user: {username}")
         else:
-            # Create new user with unique ID
-            unique_id = str(uuid.uuid4())
+            # Create new user with unique ID; a concurrent creation of the same
+            # username wins and its row is returned instead
             cursor.execute(
-                "INSERT INTO users (username, unique_id) VALUES (?, ?)",
-                (username, unique_id)
+                "INSERT INTO users (username, unique_id) VALUES (?, ?) "
+                "ON CONFLICT (username) DO NOTHING",
+                (username, str(uuid.uuid4()))
             )
             conn.commit()
-            user_id = cursor.lastrowid
+            cursor.execute("SELECT id, unique_id FROM users WHERE username = ?", (username,))
+            user_id, unique_id = cursor.fetchone()
             logger.info(f"Created new user: {username}")
 
         return {"id": user_id, "username": username, "unique_id": unique_id}
@@ -119,8 +217,211 @@ def get_or_create_user(username):
         conn.close()
 
 
-def save_weather_data(city, temperature, condition):
-    """Store weather data for analytics."""
+class WeatherHistoryBuffer:
+    """
+    In-process write buffer for weather_history.
+
+    Observations are queued in memory and written by a background thread with
+    one executemany per monthly partition and one commit per flush. A flush runs when flush_size rows
+    are pending, every flush_interval seconds, and at interpreter exit.
+
+    Each city keeps at most one row per observation interval: repeats of the
+    last queued bucket are dropped here, and the unique (city, obs_bucket)
+    index makes the insert a no-op for anything already stored.
+    """
+
+    def __init__(self, flush_size=HISTORY_FLUSH_SIZE, flush_interval=HISTORY_FLUSH_INTERVAL,
+                 max_pending=HISTORY_MAX_PENDING, observation_interval=HISTORY_OBSERVATION_INTERVAL,
+                 max_cities=HISTORY_MAX_CITIES):
+        """
+        Args:
+            flush_size (int): Pending rows that trigger an immediate flush
+            flush_interval (float): Seconds between periodic flushes
+            max_pending (int): Rows kept while the database is failing; older ones are dropped
+            observation_interval (int): Seconds of observation time per stored row and city
+            max_cities (int): Cities whose last bucket is remembered, least recently saved evicted first
+        """
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.observation_interval = observation_interval
+        self.max_cities = max_cities
+        self._pending = []
+        self._last_bucket = OrderedDict()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = None
+
+    def add(self, city, temperature, condition, observed_at=None):
+        """Queue one observation unless its city already has one in the same interval.
+
+        Args:
+            observed_at (float): Unix time of the observation (upstream "dt"); defaults to now
+
+        Returns:
+            bool: True if queued, False if it duplicated the city's last bucket
+        """
+        observed_at = int(observed_at if observed_at is not None else time.time())
+        obs_bucket = observed_at - observed_at % self.observation_interval
+        # UTC, like the CURRENT_TIMESTAMP default
+        recorded_at = datetime.fromtimestamp(observed_at, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        with self._lock:
+            if self._last_bucket.get(city) == obs_bucket:
+                return False
+            self._last_bucket[city] = obs_bucket
+            self._last_bucket.move_to_end(city)
+            if len(self._last_bucket) > self.max_cities:
+                self._last_bucket.popitem(last=False)
+            self._pending.append((city, temperature, condition, recorded_at, obs_bucket))
+            pending = len(self._pending)
+            if self._thread is None and not self._closed:
+                self._thread = threading.Thread(target=self._run, name="weather-history-writer", daemon=True)
+                self._thread.start()
+
+        if pending >= self.flush_size:
+            self._wake.set()
+        return True
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        """Write every pending observation in one transaction.
+
+        Returns:
+            int: Number of new rows written (0 on failure; the rows stay queued)
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+
+            conn = connect_db()
+            if not conn:
+                logger.error("Failed to connect to database")
+                self._requeue(batch)
+                return 0
+
+            cursor = conn.cursor()
+            try:
+                saved, partitions = history_partitions.insert_rows(cursor, batch)
+                _fold_weather_history(cursor, partitions)
+                conn.commit()
+                logger.info(f"Saved {saved} of {len(batch)} weather observations")
+                return saved
+
+            except Exception as e:
+                logger.error(f"Error saving weather data: {e}")
+                conn.rollback()
+                self._requeue(batch)
+                return 0
+
+            finally:
+                cursor.close()
+                conn.close()
+
+    def _requeue(self, batch):
+        with self._lock:
+            self._pending = batch + self._pending
+            dropped = len(self._pending) - self.max_pending
+            if dropped > 0:
+                del self._pending[:dropped]
+                logger.warning(f"Dropped {dropped} unsaved weather observations")
+
+    def pending(self):
+        """Return the number of queued observations."""
+        with self._lock:
+            return len(self._pending)
+
+    def close(self):
+        """Stop the background thread and flush what is left."""
+        self._closed = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval)
+        self.flush()
+
+
+_history_buffer = WeatherHistoryBuffer()
+atexit.register(_history_buffer.close)
+
+
+def save_weather_data(city, temperature, condition, observed_at=None):
+    """Queue weather data for analytics; it is deduplicated and written in batches (see WeatherHistoryBuffer).
+
+    Args:
+        observed_at (float): Unix time of the upstream observation ("dt"); defaults to now
+
+    Returns:
+        bool: True if queued, False if the city already has a row for this observation interval
+    """
+    return _history_buffer.add(city, temperature, condition, observed_at)
+
+
+def flush_weather_data():
+    """Write all queued weather data now and return the number of rows written."""
+    return _history_buffer.flush()
+
+
+def _fold_table(cursor, table, state_name):
+    """Fold rows of one history table added since its watermark into weather_daily."""
+    cursor.execute("SELECT last_id FROM rollup_state WHERE name = ?", (state_name,))
+    row = cursor.fetchone()
+    last_id = row[0] if row else 0
+    cursor.execute(f"SELECT max(id) FROM {table}")
+    max_id = cursor.fetchone()[0]
+    if max_id is None or max_id <= last_id:
+        return
+
+    # One row per (city, date, condition) so each upsert merges a single condition
+    cursor.execute(f"""
+        INSERT INTO weather_daily (city, date, readings, temp_sum, temp_min, temp_max, conditions)
+        SELECT city, date(recorded_at), count(*), sum(temperature), min(temperature), max(temperature), condition
+        FROM {table}
+        WHERE id > ? AND id <= ?
+        GROUP BY city, date(recorded_at), condition
+        ON CONFLICT (city, date) DO UPDATE SET
+            readings = readings + excluded.readings,
+            temp_sum = temp_sum + excluded.temp_sum,
+            temp_min = min(temp_min, excluded.temp_min),
+            temp_max = max(temp_max, excluded.temp_max),
+            conditions = CASE
+                WHEN instr(',' || conditions || ',', ',' || excluded.conditions || ',') > 0 THEN conditions
+                ELSE conditions || ',' || excluded.conditions
+            END
+    """, (last_id, max_id))
+    _set_fold_watermark(cursor, state_name, max_id)
+
+
+def _set_fold_watermark(cursor, state_name, last_id):
+    cursor.execute("""
+        INSERT INTO rollup_state (name, last_id) VALUES (?, ?)
+        ON CONFLICT (name) DO UPDATE SET last_id = excluded.last_id
+    """, (state_name, last_id))
+
+
+def _fold_weather_history(cursor, partitions=None):
+    """Fold weather_history rows added since the last fold into weather_daily.
+
+    Each monthly partition keeps its own watermark in rollup_state. Runs inside
+    the caller's transaction, so the rollup and its watermarks commit (or roll
+    back) together with the raw rows.
+
+    Args:
+        partitions (iterable): Partitions to fold (default: all)
+    """
+    for partition in sorted(partitions if partitions is not None else history_partitions.list_partitions(cursor)):
+        _fold_table(cursor, partition, partition)
+
+
+def refresh_daily_rollup():
+    """Fold any weather_history rows not yet in the weather_daily rollup."""
     conn = connect_db()
     if not conn:
         logger.error("Failed to connect to database")
@@ -128,16 +429,14 @@ def save_weather_data(city, temperature, condition):
 
     cursor = conn.cursor()
     try:
-        cursor.execute(
-            "INSERT INTO weather_history (city, temperature, condition) VALUES (?, ?, ?)",
-            (city, temperature, condition)
-        )
+        # The watermark reads and the rollup upsert must see the same snapshot
+        history_partitions.begin(cursor)
+        _fold_weather_history(cursor)
         conn.commit()
-        logger.info(f"Saved weather data for {city}")
         return True
 
     except Exception as e:
-        logger.error(f"Error saving weather data: {e}")
+        logger.error(f"Error refreshing daily rollup: {e}")
         conn.rollback()
         return False
 
@@ -156,8 +455,8 @@ def get_user_cities(user_id):
     cursor = conn.cursor()
     try:
         cursor.execute(
-            "SELECT city FROM user_cities WHERE user_id = ? ORDER BY created_at DESC LIMIT 10",
-            (user_id,)
+            "SELECT city FROM user_cities WHERE user_id = ? ORDER BY created_at DESC LIMIT ?",
+            (user_id, MAX_FAVORITE_CITIES)
         )
         cities = [row[0] for row in cursor.fetchall()]
         logger.info(f"Retrieved cities for user {user_id}")
@@ -172,8 +471,29 @@ def get_user_cities(user_id):
         conn.close()
 
 
+def get_all_favorite_cities():
+    """Get the distinct cities saved by any user, e.g. for cache refreshes."""
+    conn = connect_db()
+    if not conn:
+        logger.error("Failed to connect to database")
+        return []
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT DISTINCT city FROM user_cities")
+        return [row[0] for row in cursor.fetchall()]
+
+    except Exception as e:
+        logger.error(f"Error getting favorite cities: {e}")
+        return []
+
+    finally:
+        cursor.close()
+        conn.close()
+
+
 def add_user_city(user_id, city):
-    """Add a city to user's saved cities (up to 10)."""
+    """Add a city to user's saved cities (up to MAX_FAVORITE_CITIES)."""
     conn = connect_db()
     if not conn:
         logger.error("Failed to connect to database")
@@ -181,26 +501,26 @@ def add_user_city(user_id, city):
 
     cursor = conn.cursor()
     try:
-        # Check if user already has 10 cities saved
-        cursor.execute("SELECT COUNT(*) FROM user_cities WHERE user_id = ?", (user_id,))
-        count = cursor.fetchone()[0]
+        # The limit check and the insert are one statement, which holds the write
+        # lock throughout, so concurrent adds cannot exceed the limit
+        cursor.execute("""
+            INSERT INTO user_cities (user_id, city)
+            SELECT ?, ?
+            WHERE (SELECT COUNT(*) FROM user_cities WHERE user_id = ?) < ?
+            ON CONFLICT (user_id, city) DO NOTHING
+        """, (user_id, city, user_id, MAX_FAVORITE_CITIES))
+        added = cursor.rowcount == 1
+        conn.commit()
 
-        if count >= 10:
-            return False, "Maximum limit of 10 favorite cities reached"
+        if added:
+            logger.info(f"Added city {city} for user {user_id}")
+            return True, "City added to favorites"
 
-        # Check if city already exists for this user
+        # Nothing inserted: either a duplicate or the limit
         cursor.execute("SELECT 1 FROM user_cities WHERE user_id = ? AND city = ?", (user_id, city))
         if cursor.fetchone():
             return True, "City already in favorites"
-
-        # Add the new city
-        cursor.execute(
-            "INSERT INTO user_cities (user_id, city) VALUES (?, ?)",
-            (user_id, city)
-        )
-        conn.commit()
-        logger.info(f"Added city {city} for user {user_id}")
-        return True, "City added to favorites"
+        return False, f"Maximum limit of {MAX_FAVORITE_CITIES} favorite cities reached"
 
     except Exception as e:
         logger.error(f"Error adding user city: {e}")
@@ -239,13 +559,128 @@ def remove_user_city(user_id, city):
         conn.close()
 
 
+def get_city_location(query):
+    """Look up a cached geocode by normalized city query.
+
+    Returns:
+        dict: name, country, lat and lon, or None if the query is unknown
+    """
+    conn = connect_db()
+    if not conn:
+        logger.error("Failed to connect to database")
+        return None
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "SELECT name, country, lat, lon FROM city_locations WHERE query = ?",
+            (query,)
+        )
+        row = cursor.fetchone()
+        if row:
+            return {"name": row[0], "country": row[1], "lat": row[2], "lon": row[3]}
+        return None
+
+    except Exception as e:
+        logger.error(f"Error getting city location: {e}")
+        return None
+
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def save_city_location(queries, name, country, lat, lon):
+    """Cache a geocode under every normalized query that resolves to it."""
+    conn = connect_db()
+    if not conn:
+        logger.error("Failed to connect to database")
+        return False
+
+    cursor = conn.cursor()
+    try:
+        cursor.executemany(
+            "INSERT OR REPLACE INTO city_locations (query, name, country, lat, lon) VALUES (?, ?, ?, ?, ?)",
+            [(query, name, country, lat, lon) for query in queries]
+        )
+        conn.commit()
+        logger.info(f"Saved location for {name}")
+        return True
+
+    except Exception as e:
+        logger.error(f"Error saving city location: {e}")
+        conn.rollback()
+        return False
+
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def save_weather_snapshot(kind, key, payload):
+    """Store the latest good response of a kind ("weather", "forecast", ...) for a key."""
+    conn = connect_db()
+    if not conn:
+        logger.error("Failed to connect to database")
+        return False
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "INSERT OR REPLACE INTO weather_snapshots (kind, key, payload, fetched_at) VALUES (?, ?, ?, ?)",
+            (kind, key, payload, time.time())
+        )
+        conn.commit()
+        return True
+
+    except Exception as e:
+        logger.error(f"Error saving weather snapshot: {e}")
+        conn.rollback()
+        return False
+
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def get_weather_snapshot(kind, key):
+    """Get the latest stored response for a key.
+
+    Returns:
+        tuple: (payload, fetched_at epoch seconds), or None if nothing is stored
+    """
+    conn = connect_db()
+    if not conn:
+        logger.error("Failed to connect to database")
+        return None
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "SELECT payload, fetched_at FROM weather_snapshots WHERE kind = ? AND key = ?",
+            (kind, key)
+        )
+        return cursor.fetchone()
+
+    except Exception as e:
+        logger.error(f"Error getting weather snapshot: {e}")
+        return None
+
+    finally:
+        cursor.close()
+        conn.close()
+
+
 def get_temperature_trends(city, days=7, seasonal=True):
-    """Get temperature trends for a city.
+    """Get daily temperature trends for a city from the weather_daily rollup.
 
     Args:
         city (str): City name to get trends for
         days (int): Number of days to look back for recent trends
         seasonal (bool): If True, look at same calendar period in previous years
+
+    Returns:
+        list: (date, avg_temp, min_temp, max_temp, conditions) tuples ordered by date
     """
     conn = connect_db()
     if not conn:
@@ -255,60 +690,42 @@ def get_temperature_trends(city, days=7, seasonal=True):
     cursor = conn.cursor()
     try:
         if seasonal:
-            # Get current month and day to match seasonal patterns
-            current_date = datetime.now()
-            month = current_date.month
-            day_start = current_date.day - 15  # 15 days before current day
-            day_end = current_date.day + 15  # 15 days after current day
-
-            # Handle month boundaries
-            if day_start <= 0:
-                # Include previous month for negative days
-                day_start = 1
-
-            if day_end > 31:
-                # Cap at end of month
-                day_end = 31
-
-            # SQLite date functions are different from PostgreSQL
-            cursor.execute("""
+            # Same calendar window (+/- 15 days) in every year since the first reading
+            cursor.execute("SELECT min(date) FROM weather_daily WHERE city = ?", (city,))
+            first_date = cursor.fetchone()[0]
+            windows = _seasonal_windows(first_date, datetime.now()) if first_date else []
+            if not windows:
+                return []
+
+            cursor.execute(f"""
+                WITH windows(start_date, end_date) AS (VALUES {', '.join(['(?, ?)'] * len(windows))})
                 SELECT 
-                    date(recorded_at) as date,
-                    avg(temperature) as avg_temp,
-                    min(temperature) as min_temp,
-                    max(temperature) as max_temp,
-                    group_concat(DISTINCT condition) as conditions
-                FROM weather_history
-                WHERE city = ?
-                AND (
-                    (strftime('%m', recorded_at) = ? AND 
-                     strftime('%d', recorded_at) BETWEEN ? AND ?)
-                )
-                AND recorded_at < ?
-                GROUP BY date(recorded_at)
-                ORDER BY date(recorded_at)
-            """, (
-                city,
-                str(month).zfill(2),
-                str(day_start).zfill(2),
-                str(day_end).zfill(2),
-                (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d %H:%M:%S')
-            ))
+                    date,
+                    temp_sum / readings as avg_temp,
+                    temp_min as min_temp,
+                    temp_max as max_temp,
+                    conditions
+                FROM windows
+                JOIN weather_daily
+                    ON city = ?
+                    AND date >= windows.start_date
+                    AND date < windows.end_date
+                ORDER BY date
+            """, [bound for window in windows for bound in window] + [city])
         else:
             # Simple last N days
             cursor.execute("""
                 SELECT 
-                    date(recorded_at) as date,
-                    avg(temperature) as avg_temp,
-                    min(temperature) as min_temp,
-                    max(temperature) as max_temp,
-                    group_concat(DISTINCT condition) as conditions
-                FROM weather_history
+                    date,
+                    temp_sum / readings as avg_temp,
+                    temp_min as min_temp,
+                    temp_max as max_temp,
+                    conditions
+                FROM weather_daily
                 WHERE city = ?
-                AND recorded_at >= ?
-                GROUP BY date(recorded_at)
-                ORDER BY date(recorded_at)
-            """, (city, (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')))
+                AND date >= ?
+                ORDER BY date
+            """, (city, (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')))
 
         trends = cursor.fetchall()
         logger.info(f"Retrieved temperature trends for {city}")
@@ -323,6 +740,212 @@ def get_temperature_trends(city, days=7, seasonal=True):
         conn.close()
 
 
+def get_seasonal_daily(now=None, half_width=15):
+    """Get the daily averages of every city in this time of year's window of each past year.
+
+    Args:
+        now (datetime): Reference time (default: now)
+        half_width (int): Days either side of today's calendar date
+
+    Returns:
+        list: (city, avg_temp) tuples, one per city and day
+    """
+    conn = connect_db()
+    if not conn:
+        logger.error("Failed to connect to database")
+        return []
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT min(date) FROM weather_daily")
+        first_date = cursor.fetchone()[0]
+        windows = _seasonal_windows(first_date, now or datetime.now(), half_width) if first_date else []
+        if not windows:
+            return []
+
+        cursor.execute(f"""
+            WITH windows(start_date, end_date) AS (VALUES {', '.join(['(?, ?)'] * len(windows))})
+            SELECT city, temp_sum / readings as avg_temp
+            FROM windows
+            JOIN weather_daily
+                ON date >= windows.start_date
+                AND date < windows.end_date
+        """, [bound for window in windows for bound in window])
+        return cursor.fetchall()
+
+    except Exception as e:
+        logger.error(f"Error getting seasonal daily averages: {e}")
+        return []
+
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _seasonal_windows(first_date, now, half_width=15):
+    """Return [start, end) dates of the +/- half_width day window around now's date in each year.
+
+    Windows run from the year of first_date to this year and stop before today.
+    """
+    today = now.date()
+    windows = []
+    for year in range(int(first_date[:4]), now.year + 1):
+        try:
+            center = today.replace(year=year)
+        except ValueError:
+            # 29 February in a non-leap year
+            center = today.replace(year=year, day=28)
+        start = center - timedelta(days=half_width)
+        end = min(center + timedelta(days=half_width + 1), today)
+        if start < end:
+            windows.append((start.isoformat(), end.isoformat()))
+    return windows
+
+
+def import_weather_history(rows):
+    """Bulk-load (city, temperature, condition, recorded_at, obs_bucket) rows into history.
+
+    Rows go straight to their monthly partitions and the rollup in one transaction,
+    bypassing the write buffer (for imports and benchmarks).
+    """
+    conn = connect_db()
+    if not conn:
+        logger.error("Failed to connect to database")
+        return 0
+
+    cursor = conn.cursor()
+    try:
+        saved, partitions = history_partitions.insert_rows(cursor, rows)
+        _fold_weather_history(cursor, partitions)
+        conn.commit()
+        return saved
+
+    except Exception as e:
+        logger.error(f"Error importing weather history: {e}")
+        conn.rollback()
+        return 0
+
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def get_weather_history(start, end, cities=None):
+    """Get raw observations in [start, end), reading only the overlapping partitions.
+
+    Args:
+        start (str): Inclusive 'YYYY-MM-DD HH:MM:SS' lower bound (a 'YYYY-MM' prefix also works)
+        end (str): Exclusive upper bound
+        cities (list): City names to include (default: all)
+
+    Returns:
+        list: (city, recorded_at, temperature, condition) tuples ordered by city and time
+    """
+    conn = connect_db()
+    if not conn:
+        logger.error("Failed to connect to database")
+        return []
+
+    cursor = conn.cursor()
+    try:
+        partitions = history_partitions.partitions_between(cursor, start, end)
+        if not partitions:
+            return []
+
+        cities = list(cities) if cities is not None else None
+        city_filter = f"AND city IN ({', '.join('?' * len(cities))})" if cities is not None else ""
+        query = " UNION ALL ".join(
+            f"SELECT city, recorded_at, temperature, condition FROM {name} "
+            f"WHERE recorded_at >= ? AND recorded_at < ? {city_filter}"
+            for name in partitions
+        )
+        cursor.execute(f"{query} ORDER BY city, recorded_at", [start, end, *(cities or [])] * len(partitions))
+        return cursor.fetchall()
+
+    except Exception as e:
+        logger.error(f"Error getting weather history: {e}")
+        return []
+
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def archive_history_partitions(before, export):
+    """Hand every monthly history partition wholly before a cutoff to export, then drop it.
+
+    Each partition is read in its own short read transaction and exported
+    outside any transaction, so a slow export never holds a snapshot that
+    concurrent writers invalidate. The partitions are then folded into
+    weather_daily and dropped in one BEGIN IMMEDIATE transaction. A partition
+    that received rows after it was read is folded but kept; a later run
+    exports it again (the archive merges repeated months). If export raises,
+    nothing is dropped.
+
+    Args:
+        before (str): 'YYYY-MM-DD HH:MM:SS' cutoff; partitions of earlier months are archived
+        export (callable): Called as export(month, rows) with a 'YYYY-MM' month and
+            (city, recorded_at, temperature, condition) rows
+
+    Returns:
+        list: Archived months
+    """
+    conn = connect_db()
+    if not conn:
+        logger.error("Failed to connect to database")
+        return []
+
+    cursor = conn.cursor()
+    try:
+        cutoff_partition = history_partitions.partition_name(before)
+        candidates = [name for name in history_partitions.list_partitions(cursor) if name < cutoff_partition]
+
+        exported = {}
+        for name in candidates:
+            cursor.execute("BEGIN")
+            cursor.execute(f"SELECT city, recorded_at, temperature, condition FROM {name} ORDER BY city, recorded_at")
+            rows = cursor.fetchall()
+            cursor.execute(f"SELECT count(*), max(id) FROM {name}")
+            exported[name] = cursor.fetchone()
+            conn.commit()
+            export(history_partitions.partition_month(name), rows)
+
+        history_partitions.begin(cursor)
+        existing = set(history_partitions.list_partitions(cursor))
+        candidates = [name for name in candidates if name in existing]
+        _fold_weather_history(cursor, candidates)
+        archived = []
+        for name in candidates:
+            cursor.execute(f"SELECT count(*), max(id) FROM {name}")
+            if cursor.fetchone() == exported[name]:
+                archived.append(name)
+            else:
+                logger.warning(f"{name} changed while it was archived; keeping it for the next run")
+        _drop_history_partitions(cursor, archived)
+        conn.commit()
+        conn.executescript("PRAGMA incremental_vacuum;")
+        logger.info(f"Archived {len(archived)} weather history partitions")
+        return [history_partitions.partition_month(name) for name in archived]
+
+    except Exception as e:
+        logger.error(f"Error archiving weather history: {e}")
+        conn.rollback()
+        return []
+
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _drop_history_partitions(cursor, names):
+    """Drop folded history partitions, their fold watermarks, and refresh the view."""
+    for name in names:
+        history_partitions.drop_partition(cursor, name)
+        cursor.execute("DELETE FROM rollup_state WHERE name = ?", (name,))
+    if names:
+        history_partitions.refresh_view(cursor)
+
+
 def add_test_historical_data(city, current_temp):
     """Add sample historical data for testing alerts."""
     conn = connect_db()
@@ -333,15 +956,15 @@ def add_test_historical_data(city, current_temp):
     cursor = conn.cursor()
     try:
         # Add historical data entries with temperatures different from current
+        rows = []
         for i in range(7):
             past_date = datetime.now() - timedelta(days=i + 1)
             # Make historical temperatures 10°C lower than current
             historical_temp = current_temp - 10
-            cursor.execute(
-                "INSERT INTO weather_history (city, temperature, condition, recorded_at) VALUES (?, ?, ?, ?)",
-                (city, historical_temp, "clear", past_date.strftime('%Y-%m-%d %H:%M:%S'))
-            )
+            rows.append((city, historical_temp, "clear", past_date.strftime('%Y-%m-%d %H:%M:%S'), None))
 
+        _, partitions = history_partitions.insert_rows(cursor, rows)
+        _fold_weather_history(cursor, partitions)
         conn.commit()
         logger.info(f"Added test historical data for {city}")
         return True
@@ -357,7 +980,16 @@ def add_test_historical_data(city, current_temp):
 
 
 def cleanup_old_data(days=30):
-    """Clean up weather history older than specified days."""
+    """Clean up raw weather history older than specified days.
+
+    Whole monthly partitions before the cutoff are dropped; only the partition
+    containing the cutoff is trimmed row by row. Rows are folded into
+    weather_daily first, so daily and seasonal trends survive pruning.
+
+    Dropped rows are not archived. When the Parquet archive is in use,
+    history_archive.compact_history() owns retention and this should not be
+    scheduled, since it deletes history that compaction has not archived yet.
+    """
     conn = connect_db()
     if not conn:
         logger.error("Failed to connect to database")
@@ -365,13 +997,21 @@ def cleanup_old_data(days=30):
 
     cursor = conn.cursor()
     try:
+        history_partitions.begin(cursor)
+        _fold_weather_history(cursor)
         cutoff_date = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
-        cursor.execute(
-            "DELETE FROM weather_history WHERE recorded_at < ?",
-            (cutoff_date,)
-        )
+        cutoff_partition = history_partitions.partition_name(cutoff_date)
+
+        dropped = [name for name in history_partitions.list_partitions(cursor) if name < cutoff_partition]
+        _drop_history_partitions(cursor, dropped)
+
+        if cutoff_partition in history_partitions.list_partitions(cursor):
+            cursor.execute(f"DELETE FROM {cutoff_partition} WHERE recorded_at < ?", (cutoff_date,))
         conn.commit()
-        logger.info(f"Cleaned up weather data older than {days} days")
+
+        # Hand freed pages back to the file system (executescript runs the pragma to completion)
+        conn.executescript("PRAGMA incremental_vacuum;")
+        logger.info(f"Cleaned up weather data older than {days} days ({len(dropped)} partitions dropped)")
         return True
 
     except Exception as e:
@@ -0,0 +1,170 @@
+import os
+import sqlite3
+import threading
+import logging
+from typing import Dict, List
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Idle connections kept open per database file
+POOL_SIZE = int(os.getenv('SQLITE_POOL_SIZE', 8))
+# Milliseconds a connection waits for a competing writer before failing
+BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))
+# Page cache per connection in KiB, and bytes of the file memory-mapped for reads
+CACHE_SIZE_KB = int(os.getenv('SQLITE_CACHE_SIZE_KB', 8192))
+MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', 64 * 1024 * 1024))
+
+
+def configure_connection(conn: sqlite3.Connection) -> None:
+    """
+    Apply the pragmas every pooled connection uses.
+
+    WAL lets readers run alongside the single writer, and synchronous=NORMAL
+    is durable in WAL mode except for the last commits on power loss.
+    """
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    # Lets "PRAGMA incremental_vacuum" return freed pages to the file system;
+    # only takes effect on a new file, so it must precede the journal_mode switch
+    # (init_db converts existing files with a one-time VACUUM)
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+
+
+class PooledConnection:
+    """
+    sqlite3.Connection wrapper whose close() returns the connection to its pool.
+
+    Everything else (cursor, execute, commit, rollback, ...) is delegated, so
+    code written against sqlite3.connect() works unchanged.
+    """
+
+    def __init__(self, pool: "ConnectionPool", conn: sqlite3.Connection):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self._conn.__enter__()
+
+    def __exit__(self, exc_type, exc, tb):
+        return self._conn.__exit__(exc_type, exc, tb)
+
+    def close(self) -> None:
+        """Return the connection to the pool; further use raises ProgrammingError."""
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._pool.release(conn)
+
+    def __del__(self):
+        # Connections dropped without close() (e.g. after an exception) still go back
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of long-lived connections to one SQLite file.
+
+    A connection is used by one thread at a time (between acquire and close)
+    but may move between threads, so it is opened with check_same_thread=False;
+    this suits Streamlit, which runs each script rerun on its own thread.
+    """
+
+    def __init__(self, path: str, max_idle: int = POOL_SIZE):
+        """
+        Args:
+            path (str): Database file
+            max_idle (int): Idle connections kept open; extra ones are closed on release
+        """
+        self.path = path
+        self.max_idle = max_idle
+        self._idle: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.reused = 0
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+        configure_connection(conn)
+        with self._lock:
+            self.opened += 1
+        return conn
+
+    def acquire(self) -> PooledConnection:
+        """Check out an idle connection, opening a new one if none is free."""
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+            if conn is not None:
+                self.reused += 1
+        if conn is None:
+            conn = self._open()
+        return PooledConnection(self, conn)
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        """Take a connection back, rolling back any transaction left open."""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error as e:
+            logger.warning(f"Discarding broken connection to {self.path}: {e}")
+            conn.close()
+            return
+
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def close_all(self) -> None:
+        """Close every idle connection (checked-out ones close when released)."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def stats(self) -> Dict[str, int]:
+        """Return idle, opened and reused connection counts."""
+        with self._lock:
+            return {"idle": len(self._idle), "opened": self.opened, "reused": self.reused}
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(path: str) -> ConnectionPool:
+    """Return the shared pool for a database file, creating it on first use."""
+    with _pools_lock:
+        pool = _pools.get(path)
+        if pool is None:
+            pool = _pools[path] = ConnectionPool(path)
+        return pool
+
+
+def connect(path: str) -> PooledConnection:
+    """Drop-in replacement for sqlite3.connect(path) backed by the shared pool."""
+    return get_pool(path).acquire()
+
+
+def close_all() -> None:
+    """Close the idle connections of every pool."""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close_all()
@@ -0,0 +1,177 @@
+"""
+Cached 3-hourly forecasts and their vectorized daily aggregation.
+
+A Forecast keeps the API's 3-hourly entries for one city as ForecastHour
+records; that raw forecast is what the service caches. Every view is derived
+from it on demand without refetching: hourly() slices the entries, and
+daily() summarizes them per day (computed once, then memoized), which
+highs_lows() reuses.
+
+aggregate_daily() summarizes many forecasts at once: their entries are
+loaded into NumPy arrays in a single pass and every city's per-day mean, min
+and max temperature, mean humidity and wind speed, and most frequent
+condition (ties go to the condition seen first that day) come from grouped
+operations. Days are calendar days in UTC, matching the API's dt_txt.
+"""
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from models import ForecastDay, ForecastHour
+
+SECONDS_PER_DAY = 86400
+
+
+class Forecast:
+    """Raw 3-hourly forecast for one city, with views derived on first use."""
+
+    __slots__ = ("hours", "_daily")
+
+    def __init__(self, hours: Sequence[ForecastHour]):
+        """
+        Args:
+            hours (sequence): ForecastHour entries in time order
+        """
+        self.hours = tuple(hours)
+        self._daily: Optional[List[ForecastDay]] = None
+
+    @classmethod
+    def from_payload(cls, data: Dict) -> "Forecast":
+        """
+        Read the entries of a decoded /forecast response.
+
+        Raises:
+            KeyError: If the response lacks the expected fields
+        """
+        return cls([
+            ForecastHour(
+                time=item['dt'],
+                temperature=item['main']['temp'],
+                condition=item['weather'][0]['main'].lower(),
+                humidity=item['main']['humidity'],
+                wind_speed=item['wind']['speed'],
+                pop=item.get('pop', 0.0)
+            )
+            for item in data['list']
+        ])
+
+    @classmethod
+    def from_plain(cls, value: Dict) -> "Forecast":
+        """Rebuild a forecast from its _asdict() form (e.g. a JSON snapshot)."""
+        return cls([ForecastHour(**hour) for hour in value["hours"]])
+
+    def _asdict(self) -> Dict[str, Tuple[ForecastHour, ...]]:
+        return {"hours": self.hours}
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Forecast) and self.hours == other.hours
+
+    def __len__(self) -> int:
+        return len(self.hours)
+
+    def hourly(self, hours: int = 24, start: Optional[float] = None) -> List[ForecastHour]:
+        """
+        Return the entries within the next `hours` hours.
+
+        Args:
+            hours (int): Length of the window
+            start (float): Unix time the window starts at (default: the first entry)
+        """
+        if not self.hours:
+            return []
+        start = self.hours[0].time if start is None else start
+        return [hour for hour in self.hours if start <= hour.time < start + hours * 3600]
+
+    def daily(self) -> List[ForecastDay]:
+        """Return one ForecastDay per day, aggregating the entries on first call."""
+        if self._daily is None:
+            aggregate_daily([self])
+        return self._daily
+
+    def highs_lows(self) -> List[Tuple[str, float, float]]:
+        """Return (date, low, high) temperatures per day."""
+        return [(day.date, day.temp_min, day.temp_max) for day in self.daily()]
+
+
+def _group_starts(sorted_groups: np.ndarray) -> np.ndarray:
+    """Return the index where each run of equal values starts."""
+    return np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]])
+
+
+def aggregate_daily(forecasts: Sequence[Forecast]) -> List[List[ForecastDay]]:
+    """
+    Summarize many forecasts by day in one vectorized pass.
+
+    Each forecast's daily() view is filled in as a side effect.
+
+    Args:
+        forecasts (sequence): Forecasts, e.g. one per city
+
+    Returns:
+        list: For each forecast, its ForecastDay records in date order
+    """
+    results = [[] for _ in forecasts]
+    if any(forecast.hours for forecast in forecasts):
+        _aggregate_hours(forecasts, results)
+
+    for forecast, days in zip(forecasts, results):
+        forecast._daily = days
+    return results
+
+
+def _aggregate_hours(forecasts: Sequence[Forecast], results: List[List[ForecastDay]]) -> None:
+    """Append the per-day summaries of each forecast to its list in results."""
+    # Transpose every forecast's records into field columns, then stack them
+    columns = [tuple(zip(*forecast.hours)) for forecast in forecasts if forecast.hours]
+
+    def stack(field, dtype):
+        return np.concatenate([np.asarray(column[field], dtype=dtype) for column in columns])
+
+    fields = ForecastHour._fields
+    sources = np.repeat([index for index, forecast in enumerate(forecasts) if forecast.hours],
+                        [len(forecast.hours) for forecast in forecasts if forecast.hours])
+    days = stack(fields.index("time"), np.int64) // SECONDS_PER_DAY
+    temps = stack(fields.index("temperature"), float)
+    humidity = stack(fields.index("humidity"), float)
+    wind = stack(fields.index("wind_speed"), float)
+    condition_names, condition_codes = np.unique(stack(fields.index("condition"), object), return_inverse=True)
+
+    # One group per (source, day); np.unique orders them by source, then date
+    first_day = days.min()
+    span = days.max() - first_day + 1
+    group_keys, groups = np.unique(sources * span + (days - first_day), return_inverse=True)
+    group_count = len(group_keys)
+    readings = np.bincount(groups, minlength=group_count)
+
+    def mean(values):
+        return np.bincount(groups, weights=values, minlength=group_count) / readings
+
+    order = np.argsort(groups, kind='stable')
+    starts = _group_starts(groups[order])
+    temp_min = np.minimum.reduceat(temps[order], starts)
+    temp_max = np.maximum.reduceat(temps[order], starts)
+
+    # Condition mode: count each (group, condition) pair, then keep the most
+    # frequent pair per group, earliest first occurrence breaking ties
+    condition_count = len(condition_names)
+    pairs, first_seen, pair_counts = np.unique(groups * condition_count + condition_codes,
+                                               return_index=True, return_counts=True)
+    pair_groups = pairs // condition_count
+    ranked = np.lexsort((first_seen, -pair_counts, pair_groups))
+    dominant = (pairs % condition_count)[ranked[_group_starts(pair_groups[ranked])]]
+
+    group_sources = (group_keys // span).tolist()
+    group_dates = np.datetime_as_string((group_keys % span + first_day).astype('datetime64[D]'))
+
+    for source, date, temperature, low, high, humid, speed, code in zip(
+            group_sources, group_dates.tolist(), mean(temps).tolist(), temp_min.tolist(), temp_max.tolist(),
+            mean(humidity).tolist(), mean(wind).tolist(), dominant.tolist()):
+        results[source].append(ForecastDay(
+            date=date,
+            temperature=temperature,
+            condition=condition_names[code],
+            humidity=humid,
+            wind_speed=speed,
+            temp_min=low,
+            temp_max=high
+        ))
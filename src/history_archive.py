@@ -0,0 +1,226 @@
+"""
+Columnar archive for cold weather history.
+
+compact_history() moves monthly history partitions older than HOT_DAYS out of
+SQLite into Parquet files partitioned by city and month
+(archive/city=<name>/month=<YYYY-MM>/<YYYY-MM>-0.parquet). load_history()
+reads raw observations back from both stores, pruning archive files by city
+and month, and daily_trends() / seasonal_baselines() aggregate them with
+vectorized pandas/NumPy operations across many cities at once.
+
+Requires pyarrow; the rest of the app works without it.
+"""
+import os
+import re
+import logging
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = ds = pq = None
+
+import database
+from history_partitions import next_month
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Archive location; database.HOT_DAYS is the days of history kept in SQLite before compaction
+ARCHIVE_DIR = os.getenv('WEATHER_ARCHIVE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'archive'))
+HOT_DAYS = database.HOT_DAYS
+
+COLUMNS = ["city", "recorded_at", "temperature", "condition"]
+
+
+def _require_pyarrow() -> None:
+    if pq is None:
+        raise RuntimeError("The history archive needs pyarrow (pip install pyarrow)")
+
+
+def _partitioning():
+    # Explicit string types, so cities like "2024" are not read back as integers
+    return ds.partitioning(pa.schema([("city", pa.string()), ("month", pa.string())]), flavor="hive")
+
+
+def _write_month(archive_dir: str, month: str, rows: List[tuple]) -> None:
+    """Write one month of (city, recorded_at, temperature, condition) rows, one file per city."""
+    if not rows:
+        return
+
+    frame = pd.DataFrame(rows, columns=COLUMNS)
+    frame["recorded_at"] = pd.to_datetime(frame["recorded_at"])
+    # The archive's dtypes, so rows read back from it compare equal to new ones
+    frame["temperature"] = frame["temperature"].astype("float32")
+
+    # A month archived again (e.g. rows written late) is merged with what is already
+    # there; a city has one observation per timestamp, so deduplicating on that key
+    # keeps a retried compaction idempotent
+    existing = _read_archive(None, [month], archive_dir)
+    if not existing.empty:
+        frame = (pd.concat([existing, frame], ignore_index=True)
+                 .drop_duplicates(subset=["city", "recorded_at"], ignore_index=True))
+
+    table = pa.table({
+        "city": frame["city"].astype(str),
+        "month": [month] * len(frame),
+        "recorded_at": frame["recorded_at"],
+        "temperature": frame["temperature"].astype("float32"),
+        "condition": pa.array(frame["condition"]).dictionary_encode()
+    })
+    ds.write_dataset(table, archive_dir, format="parquet", partitioning=_partitioning(),
+                     basename_template=f"{month}-{{i}}.parquet", existing_data_behavior="overwrite_or_ignore")
+
+
+def compact_history(hot_days: int = HOT_DAYS, archive_dir: str = ARCHIVE_DIR) -> List[str]:
+    """
+    Move history partitions older than hot_days from SQLite into the Parquet archive.
+
+    Args:
+        hot_days (int): Days of history that stay in SQLite
+        archive_dir (str): Archive root directory
+
+    Returns:
+        list: Archived 'YYYY-MM' months
+    """
+    _require_pyarrow()
+    cutoff = (datetime.now() - timedelta(days=hot_days)).strftime('%Y-%m-%d %H:%M:%S')
+    months = database.archive_history_partitions(cutoff, lambda month, rows: _write_month(archive_dir, month, rows))
+    logger.info(f"Compacted {len(months)} months of weather history into {archive_dir}")
+    return months
+
+
+def archived_months(archive_dir: str = ARCHIVE_DIR) -> List[str]:
+    """Return the 'YYYY-MM' months present in the archive."""
+    if not os.path.isdir(archive_dir):
+        return []
+    months = set()
+    for _, dirs, _ in os.walk(archive_dir):
+        months.update(match.group(1) for match in map(re.compile(r"month=(\d{4}-\d{2})$").match, dirs) if match)
+    return sorted(months)
+
+
+def _first_year(archive_dir: str) -> Optional[int]:
+    """Return the earliest year with observations in either store."""
+    years = [int(month[:4]) for month in archived_months(archive_dir)[:1]]
+    conn = database.connect_db()
+    if conn:
+        try:
+            # The daily rollup covers archived and hot history alike
+            first_date = conn.execute("SELECT min(date) FROM weather_daily").fetchone()[0]
+            if first_date:
+                years.append(int(first_date[:4]))
+        finally:
+            conn.close()
+    return min(years) if years else None
+
+
+def _read_archive(cities: Optional[List[str]], months: Optional[List[str]], archive_dir: str) -> pd.DataFrame:
+    if pq is None or not os.path.isdir(archive_dir):
+        return pd.DataFrame(columns=COLUMNS)
+
+    dataset = ds.dataset(archive_dir, format="parquet", partitioning=_partitioning())
+    condition = None
+    if cities is not None:
+        condition = ds.field("city").isin(cities)
+    if months is not None:
+        month_filter = ds.field("month").isin(months)
+        condition = month_filter if condition is None else condition & month_filter
+
+    table = dataset.to_table(columns=COLUMNS, filter=condition)
+    frame = table.to_pandas()
+    frame["condition"] = frame["condition"].astype(str)
+    return frame
+
+
+def _read_hot(cities: Optional[List[str]], months: Optional[List[str]]) -> pd.DataFrame:
+    if months is None:
+        # Bounds must not look numeric: recorded_at has NUMERIC affinity
+        rows = database.get_weather_history("0000-01", "9999-12", cities)
+    else:
+        rows = [row for month in months for row in database.get_weather_history(month, next_month(month), cities)]
+    frame = pd.DataFrame(rows, columns=COLUMNS)
+    frame["recorded_at"] = pd.to_datetime(frame["recorded_at"])
+    return frame
+
+
+def load_history(cities: Optional[Iterable[str]] = None, months: Optional[Iterable[str]] = None,
+                 archive_dir: str = ARCHIVE_DIR) -> pd.DataFrame:
+    """
+    Load raw observations from the archive and from SQLite.
+
+    Args:
+        cities (iterable): City names (default: all)
+        months (iterable): 'YYYY-MM' months to read (default: all)
+        archive_dir (str): Archive root directory
+
+    Returns:
+        DataFrame: city, recorded_at (datetime), temperature, condition
+    """
+    cities = list(cities) if cities is not None else None
+    months = sorted(set(months)) if months is not None else None
+    frames = [frame for frame in (_read_archive(cities, months, archive_dir), _read_hot(cities, months))
+              if not frame.empty]
+    if not frames:
+        return pd.DataFrame(columns=COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+
+def daily_trends(cities: Optional[Iterable[str]] = None, months: Optional[Iterable[str]] = None,
+                 archive_dir: str = ARCHIVE_DIR) -> pd.DataFrame:
+    """
+    Aggregate observations into daily statistics per city.
+
+    Returns:
+        DataFrame: city, date, avg_temp, min_temp, max_temp, readings
+    """
+    history = load_history(cities, months, archive_dir)
+    if history.empty:
+        return pd.DataFrame(columns=["city", "date", "avg_temp", "min_temp", "max_temp", "readings"])
+
+    history["date"] = history["recorded_at"].dt.normalize()
+    return (history.groupby(["city", "date"])["temperature"]
+            .agg(avg_temp="mean", min_temp="min", max_temp="max", readings="count")
+            .reset_index())
+
+
+def seasonal_baselines(cities: Optional[Iterable[str]] = None, now: Optional[datetime] = None,
+                       half_width: int = 15, archive_dir: str = ARCHIVE_DIR) -> pd.DataFrame:
+    """
+    Compute each city's temperature baseline for the current time of year.
+
+    Uses every observation within half_width days of today's calendar date in
+    any year (before today), reading only the months such windows touch.
+
+    Returns:
+        DataFrame indexed by city: mean, std, min, max, readings
+    """
+    now = now or datetime.now()
+    month_numbers = sorted({(now + timedelta(days=offset)).strftime('%m')
+                            for offset in range(-half_width, half_width + 1)})
+    first_year = _first_year(archive_dir) or now.year
+    months = [f"{year}-{number}" for year in range(first_year, now.year + 1) for number in month_numbers]
+
+    history = load_history(cities, months, archive_dir)
+    if history.empty:
+        return pd.DataFrame(columns=["mean", "std", "min", "max", "readings"])
+
+    # Circular day-of-year distance, so windows wrap around New Year
+    recorded_at = history["recorded_at"]
+    day_of_year = recorded_at.dt.dayofyear.to_numpy()
+    distance = np.abs((day_of_year - now.timetuple().tm_yday + 183) % 366 - 183)
+    in_window = (distance <= half_width) & (recorded_at < pd.Timestamp(now.date())).to_numpy()
+
+    return (history.loc[in_window].groupby("city")["temperature"]
+            .agg(["mean", "std", "min", "max", "count"])
+            .rename(columns={"count": "readings"}))
@@ -0,0 +1,175 @@
+"""
+Monthly partitioning of weather history.
+
+Raw observations live in one table per calendar month of recorded_at
+(weather_history_YYYY_MM) with identical schemas. A weather_history view
+unions them for ad-hoc reads; writers and range queries use the helpers
+below to touch only the months they need, and retention drops whole tables.
+
+All helpers take a cursor and run inside the caller's transaction.
+"""
+from typing import Iterable, List, Set, Tuple
+
+PARTITION_PREFIX = "weather_history_"
+VIEW_NAME = "weather_history"
+COLUMNS = "id, city, temperature, condition, recorded_at, obs_bucket"
+
+
+def partition_name(recorded_at: str) -> str:
+    """Return the partition holding a 'YYYY-MM-DD HH:MM:SS' timestamp."""
+    return f"{PARTITION_PREFIX}{recorded_at[:4]}_{recorded_at[5:7]}"
+
+
+def partition_month(name: str) -> str:
+    """Return the 'YYYY-MM' month of a partition name."""
+    return name[len(PARTITION_PREFIX):].replace("_", "-")
+
+
+def next_month(month: str) -> str:
+    """Return the 'YYYY-MM' month after a 'YYYY-MM' month."""
+    year, number = int(month[:4]), int(month[5:7])
+    return f"{year + number // 12:04d}-{number % 12 + 1:02d}"
+
+
+def begin(cursor) -> None:
+    """
+    Open a write transaction unless one is already active (DDL does not start one implicitly).
+
+    BEGIN IMMEDIATE takes the write lock up front (waiting up to busy_timeout).
+    A deferred BEGIN would read first and then fail with SQLITE_BUSY_SNAPSHOT,
+    which busy_timeout does not retry, as soon as another connection commits
+    before the first write.
+    """
+    if not cursor.connection.in_transaction:
+        cursor.execute("BEGIN IMMEDIATE")
+
+
+def list_partitions(cursor) -> List[str]:
+    """Return every partition name, oldest first."""
+    cursor.execute(f"""
+        SELECT name FROM sqlite_master
+        WHERE type = 'table' AND name GLOB '{PARTITION_PREFIX}[0-9][0-9][0-9][0-9]_[0-9][0-9]'
+        ORDER BY name
+    """)
+    return [row[0] for row in cursor.fetchall()]
+
+
+def partitions_between(cursor, start: str, end: str) -> List[str]:
+    """Return the partitions that can hold timestamps in [start, end)."""
+    first, last = partition_name(start), partition_name(end)
+    return [name for name in list_partitions(cursor) if first <= name <= last]
+
+
+def refresh_view(cursor) -> None:
+    """Recreate the weather_history view over the current partitions."""
+    begin(cursor)
+    partitions = list_partitions(cursor)
+    if partitions:
+        body = " UNION ALL ".join(f"SELECT {COLUMNS} FROM {name}" for name in partitions)
+    else:
+        body = ("SELECT NULL AS id, NULL AS city, NULL AS temperature, NULL AS condition, "
+                "NULL AS recorded_at, NULL AS obs_bucket WHERE 0")
+    cursor.execute(f"DROP VIEW IF EXISTS {VIEW_NAME}")
+    cursor.execute(f"CREATE VIEW {VIEW_NAME} AS {body}")
+
+
+def ensure_partition(cursor, name: str) -> bool:
+    """Create a partition and refresh the view if it does not exist yet; return True if created."""
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,))
+    if cursor.fetchone():
+        return False
+
+    begin(cursor)
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {name} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            city TEXT NOT NULL,
+            temperature FLOAT NOT NULL,
+            condition TEXT NOT NULL,
+            recorded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            obs_bucket INTEGER
+        )
+    ''')
+    # Per-city lookups by time range, and one observation per city and bucket
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{name}_city_recorded ON {name} (city, recorded_at)")
+    cursor.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS idx_{name}_city_bucket ON {name} (city, obs_bucket)")
+    refresh_view(cursor)
+    return True
+
+
+def insert_rows(cursor, rows: Iterable[Tuple]) -> Tuple[int, Set[str]]:
+    """
+    Route (city, temperature, condition, recorded_at, obs_bucket) rows to their partitions.
+
+    Rows repeating a stored (city, obs_bucket) are skipped.
+
+    Returns:
+        tuple: (number of rows inserted, names of the partitions written to)
+    """
+    by_partition = {}
+    for row in rows:
+        by_partition.setdefault(partition_name(row[3]), []).append(row)
+
+    # Hold the write lock from the existence check on, so retention cannot drop
+    # a partition between ensure_partition() and the insert
+    begin(cursor)
+    inserted = 0
+    for name, partition_rows in by_partition.items():
+        ensure_partition(cursor, name)
+        cursor.executemany(
+            f"INSERT INTO {name} (city, temperature, condition, recorded_at, obs_bucket) "
+            "VALUES (?, ?, ?, ?, ?) ON CONFLICT (city, obs_bucket) DO NOTHING",
+            partition_rows
+        )
+        inserted += cursor.rowcount
+    return inserted, set(by_partition)
+
+
+def drop_partition(cursor, name: str) -> None:
+    """Drop a partition; the caller refreshes the view afterwards."""
+    begin(cursor)
+    cursor.execute(f"DROP TABLE IF EXISTS {name}")
+
+
+def has_legacy_table(cursor) -> bool:
+    """Return True if weather_history is still a single unpartitioned table."""
+    cursor.execute("SELECT type FROM sqlite_master WHERE name = ?", (VIEW_NAME,))
+    row = cursor.fetchone()
+    return row is not None and row[0] == "table"
+
+
+def migrate_legacy_table(cursor) -> List[str]:
+    """
+    Move the rows of an unpartitioned weather_history table into monthly partitions.
+
+    The legacy table is dropped and replaced by the view.
+
+    Returns:
+        list: Partitions that received rows
+    """
+    cursor.execute(f"PRAGMA table_info({VIEW_NAME})")
+    has_bucket = "obs_bucket" in [column[1] for column in cursor.fetchall()]
+
+    begin(cursor)
+    cursor.execute(f"ALTER TABLE {VIEW_NAME} RENAME TO {VIEW_NAME}_legacy")
+    # Lets each month be copied with a range scan instead of a full scan
+    cursor.execute(f"CREATE INDEX idx_{VIEW_NAME}_legacy_recorded ON {VIEW_NAME}_legacy (recorded_at)")
+    cursor.execute(f"SELECT DISTINCT substr(recorded_at, 1, 7) FROM {VIEW_NAME}_legacy")
+    months = sorted(row[0] for row in cursor.fetchall() if row[0])
+
+    partitions = []
+    for month in months:
+        name = partition_name(f"{month}-01")
+        ensure_partition(cursor, name)
+        cursor.execute(f"""
+            INSERT INTO {name} (city, temperature, condition, recorded_at, obs_bucket)
+            SELECT city, temperature, condition, recorded_at, {'obs_bucket' if has_bucket else 'NULL'}
+            FROM {VIEW_NAME}_legacy
+            WHERE recorded_at >= ? AND recorded_at < ?
+            ORDER BY id
+        """, (month, next_month(month)))
+        partitions.append(name)
+
+    cursor.execute(f"DROP TABLE {VIEW_NAME}_legacy")
+    refresh_view(cursor)
+    return partitions
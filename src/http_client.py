@@ -0,0 +1,325 @@
+import os
+import random
+import threading
+import time
+import logging
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from circuit_breaker import CircuitBreakerRegistry, FAILURE_THRESHOLD, SLOW_CALL_THRESHOLD, RESET_TIMEOUT
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Connection pool and retry settings
+POOL_SIZE = int(os.getenv('OPENWEATHER_POOL_SIZE', 10))
+MAX_RETRIES = int(os.getenv('OPENWEATHER_MAX_RETRIES', 3))
+BACKOFF_BASE = float(os.getenv('OPENWEATHER_BACKOFF_BASE', 0.5))
+BACKOFF_MAX = float(os.getenv('OPENWEATHER_BACKOFF_MAX', 8))
+REQUEST_TIMEOUT = float(os.getenv('OPENWEATHER_TIMEOUT', 10))
+
+# Status codes worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Request rate allowed by our OpenWeather plan (free tier: 60 calls/minute)
+PLAN_MAX_RPS = float(os.getenv('OPENWEATHER_MAX_RPS', 1.0))
+
+# Number of recent attempts kept for latency statistics
+ATTEMPT_HISTORY = 1000
+
+
+def backoff_delay(attempt: int, base: float = BACKOFF_BASE, cap: float = BACKOFF_MAX) -> float:
+    """
+    Compute a jittered exponential backoff delay ("full jitter").
+
+    Args:
+        attempt (int): Zero-based number of the attempt that just failed
+        base (float): Delay in seconds for the first retry
+        cap (float): Upper bound for the delay in seconds
+
+    Returns:
+        float: Seconds to sleep before the next attempt
+    """
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def retry_after_delay(headers, cap: float = BACKOFF_MAX) -> Optional[float]:
+    """Read a numeric Retry-After header, capped; None if absent or unparsable."""
+    value = headers.get("Retry-After")
+    try:
+        return min(cap, max(0.0, float(value)))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Thread-safe token bucket limiting how many requests start per second."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        """
+        Args:
+            rate (float): Tokens added per second (sustained requests per second)
+            capacity (float): Maximum burst size (default: one second's worth, at least 1)
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _wait_time(self, tokens: float) -> float:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return 0.0
+        return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        """Block until the requested number of tokens is available, then take them."""
+        while True:
+            with self._lock:
+                wait = self._wait_time(tokens)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+
+# Limiter applied to requests made in the current context (see rate_limited)
+_request_limiter = ContextVar("request_limiter", default=None)
+
+
+@contextmanager
+def rate_limited(limiter: TokenBucket):
+    """
+    Apply a token bucket to every upstream request made inside the block.
+
+    Args:
+        limiter (TokenBucket): Bucket to draw one token from per attempt
+    """
+    token = _request_limiter.set(limiter)
+    try:
+        yield limiter
+    finally:
+        _request_limiter.reset(token)
+
+
+class AttemptLog:
+    """Thread-safe record of recent request attempts and their latency."""
+
+    def __init__(self, maxlen: int = ATTEMPT_HISTORY):
+        self._lock = threading.Lock()
+        self._attempts = deque(maxlen=maxlen)
+
+    def record(self, endpoint: str, attempt: int, status: Optional[int], start: float,
+               error: Optional[str] = None) -> None:
+        """
+        Record one attempt.
+
+        Args:
+            endpoint (str): Endpoint label
+            attempt (int): Zero-based attempt number
+            status (int): HTTP status, or None if no response arrived
+            start (float): time.perf_counter() value taken before the attempt
+            error (str): Exception name for failed attempts
+        """
+        latency_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self._attempts.append({
+                "endpoint": endpoint,
+                "attempt": attempt,
+                "status": status,
+                "error": error,
+                "latency_ms": round(latency_ms, 1)
+            })
+
+    def recent(self):
+        """Return a copy of the most recent attempt records."""
+        with self._lock:
+            return list(self._attempts)
+
+    def stats(self) -> Dict[str, Dict]:
+        """
+        Summarize recent attempts per endpoint.
+
+        Returns:
+            dict: Attempt, retry and error counts plus average and p95 latency in ms
+        """
+        summary = {}
+        for record in self.recent():
+            summary.setdefault(record["endpoint"], []).append(record)
+
+        stats = {}
+        for endpoint, records in summary.items():
+            latencies = sorted(record["latency_ms"] for record in records)
+            stats[endpoint] = {
+                "attempts": len(records),
+                "retries": sum(1 for record in records if record["attempt"] > 0),
+                "errors": sum(1 for record in records
+                              if record["error"] or record["status"] in RETRY_STATUSES),
+                "avg_latency_ms": round(sum(latencies) / len(latencies), 1),
+                "p95_latency_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            }
+        return stats
+
+
+class HttpClient:
+    """
+    Keep-alive HTTP client for the OpenWeather API.
+
+    All threads share one connection pool; each thread gets its own
+    requests.Session (and cookie jar) mounted on that pool, so the client is
+    safe to use from Streamlit's script threads and worker pools.
+
+    Each endpoint has a circuit breaker: once it opens, requests fail fast
+    with CircuitOpenError instead of waiting for the timeout.
+    """
+
+    def __init__(self, pool_size: int = POOL_SIZE, max_retries: int = MAX_RETRIES,
+                 backoff_base: float = BACKOFF_BASE, backoff_max: float = BACKOFF_MAX,
+                 timeout: float = REQUEST_TIMEOUT, failure_threshold: int = FAILURE_THRESHOLD,
+                 slow_call_threshold: Optional[float] = SLOW_CALL_THRESHOLD,
+                 reset_timeout: float = RESET_TIMEOUT):
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+
+        self._adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self._local = threading.local()
+        self.attempt_log = AttemptLog()
+        self.breakers = CircuitBreakerRegistry(failure_threshold=failure_threshold,
+                                               slow_call_threshold=slow_call_threshold,
+                                               reset_timeout=reset_timeout)
+
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.mount("https://", self._adapter)
+            session.mount("http://", self._adapter)
+            self._local.session = session
+        return session
+
+    def get(self, url: str, params: Dict, endpoint: str = "default") -> requests.Response:
+        """
+        Issue a GET request, retrying 429/5xx responses and connection errors.
+
+        Read timeouts are not retried: an upstream that accepted the connection
+        but hangs would otherwise hold the calling thread for every attempt.
+
+        Args:
+            url (str): Request URL
+            params (dict): Query parameters
+            endpoint (str): Label used for latency statistics
+
+        Returns:
+            requests.Response: The final response, which may still be an error status
+
+        Raises:
+            CircuitOpenError: If the endpoint's circuit is open
+            requests.exceptions.RequestException: If the last attempt fails to connect,
+                or the response does not arrive within the timeout
+        """
+        session = self._session()
+        limiter = _request_limiter.get()
+        breaker = self.breakers.get(endpoint)
+
+        for attempt in range(self.max_retries + 1):
+            breaker.check()
+            if limiter is not None:
+                limiter.acquire()
+            start = time.perf_counter()
+            try:
+                response = session.get(url, params=params, timeout=self.timeout)
+            except requests.exceptions.ReadTimeout as e:
+                self.attempt_log.record(endpoint, attempt, None, start, type(e).__name__)
+                breaker.record_failure()
+                raise
+            except requests.exceptions.ConnectionError as e:
+                # Includes ConnectTimeout: nothing was sent, so retrying is cheap and safe
+                self.attempt_log.record(endpoint, attempt, None, start, type(e).__name__)
+                breaker.record_failure()
+                if attempt == self.max_retries:
+                    raise
+                delay = backoff_delay(attempt, self.backoff_base, self.backoff_max)
+                logger.warning(f"{endpoint} request failed ({type(e).__name__}), retrying in {delay:.2f}s")
+                time.sleep(delay)
+                continue
+            except requests.exceptions.RequestException:
+                breaker.record_failure()
+                raise
+
+            self.attempt_log.record(endpoint, attempt, response.status_code, start)
+            if response.status_code in RETRY_STATUSES:
+                breaker.record_failure()
+            else:
+                breaker.record_success(time.perf_counter() - start)
+            if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                return response
+
+            delay = retry_after_delay(response.headers, self.backoff_max)
+            if delay is None:
+                delay = backoff_delay(attempt, self.backoff_base, self.backoff_max)
+            logger.warning(f"{endpoint} request returned {response.status_code}, retrying in {delay:.2f}s")
+            response.close()
+            time.sleep(delay)
+
+    def recent_attempts(self):
+        """Return a copy of the most recent attempt records."""
+        return self.attempt_log.recent()
+
+    def stats(self) -> Dict[str, Dict]:
+        """Summarize recent attempts per endpoint (see AttemptLog.stats)."""
+        return self.attempt_log.stats()
+
+    def health(self) -> Dict[str, Dict]:
+        """Return the circuit breaker state of every endpoint used so far."""
+        return self.breakers.snapshot()
+
+    def close(self) -> None:
+        """Close pooled connections."""
+        self._adapter.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> HttpClient:
+    """Return the shared HttpClient, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = HttpClient()
+    return _client
+
+
+def configure_client(**settings) -> HttpClient:
+    """
+    Replace the shared client, e.g. to change the pool size or retry policy.
+
+    Args:
+        **settings: Keyword arguments for HttpClient
+
+    Returns:
+        HttpClient: The new shared client
+    """
+    global _client
+    with _client_lock:
+        old_client, _client = _client, HttpClient(**settings)
+    if old_client is not None:
+        old_client.close()
+    return _client
@@ -0,0 +1,137 @@
+"""
+One identity per username across auth.db and weatherwise.db.
+
+Credentials live in auth.db and favorites hang off weatherwise.db's users
+table. resolve_identity() reads both records in a single query (auth.db is
+ATTACHed to the weather database connection), creates the weather record if
+it is missing, and caches the result in memory, so rendering for a logged-in
+user needs no identity queries. Registering or changing a password through
+this module invalidates the cached entry.
+"""
+import os
+import uuid
+import logging
+from typing import Dict, Optional, Tuple, Union
+
+import auth
+import database
+from cache import TTLCache
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Seconds an identity is cached; bounds staleness after changes made by other processes
+IDENTITY_CACHE_TTL = float(os.getenv('IDENTITY_CACHE_TTL', 3600))
+
+_identities = TTLCache(IDENTITY_CACHE_TTL, 4096)
+
+
+def _attach_auth_db(conn) -> None:
+    """ATTACH auth.db as "auth" unless this (pooled) connection already has it."""
+    if not any(row[1] == "auth" for row in conn.execute("PRAGMA database_list")):
+        conn.execute("ATTACH DATABASE ? AS auth", (auth.AUTH_DB_FILE,))
+
+
+def _select_identity(cursor, username: str) -> Optional[Tuple]:
+    cursor.execute("""
+        SELECT a.id, a.username, a.name, a.email, u.id, u.unique_id
+        FROM auth.users a
+        LEFT JOIN main.users u ON u.username = a.username
+        WHERE a.username = ?
+    """, (username,))
+    return cursor.fetchone()
+
+
+def resolve_identity(username: str) -> Optional[Dict[str, Union[int, str]]]:
+    """
+    Get a registered user's ids in both databases.
+
+    Args:
+        username (str): Username
+
+    Returns:
+        dict: username, name, email, auth_id (auth.db), user_id and unique_id
+            (weatherwise.db); None if the username is not registered
+    """
+    if not username:
+        return None
+    identity = _identities.get(username)
+    if identity is not None:
+        return identity
+
+    conn = database.connect_db()
+    if not conn:
+        logger.error("Failed to connect to database")
+        return None
+
+    cursor = conn.cursor()
+    try:
+        _attach_auth_db(conn)
+        row = _select_identity(cursor, username)
+        if row is None:
+            return None
+
+        if row[4] is None:
+            # Registered before the weather record was created alongside it
+            cursor.execute(
+                "INSERT INTO users (username, unique_id) VALUES (?, ?) ON CONFLICT (username) DO NOTHING",
+                (username, str(uuid.uuid4()))
+            )
+            conn.commit()
+            row = _select_identity(cursor, username)
+
+        identity = {
+            "auth_id": row[0],
+            "username": row[1],
+            "name": row[2],
+            "email": row[3],
+            "user_id": row[4],
+            "unique_id": row[5]
+        }
+        _identities.set(username, identity)
+        return identity
+
+    except Exception as e:
+        logger.error(f"Error resolving identity for {username}: {e}")
+        conn.rollback()
+        return None
+
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def invalidate_identity(username: Optional[str] = None) -> None:
+    """Drop the cached identity of username (default: every user)."""
+    if username is None:
+        _identities.clear()
+    else:
+        _identities.delete(username)
+
+
+def login(username: str, password: str) -> Optional[Dict[str, Union[int, str]]]:
+    """Check a password and return the user's identity, or None if the credentials are wrong."""
+    auth_success, _ = auth.authenticate(username, password)
+    if not auth_success:
+        return None
+    return resolve_identity(username)
+
+
+def register(username: str, name: str, password: str, email: str) -> Tuple[bool, str]:
+    """Register a user in auth.db and create the matching weather record."""
+    success, message = auth.register_user(username, name, password, email)
+    invalidate_identity(username)
+    if success:
+        resolve_identity(username)
+    return success, message
+
+
+def change_password(username: str, current_password: str, new_password: str) -> Tuple[bool, str]:
+    """Change a user's password and invalidate the cached identity."""
+    success, message = auth.change_password(username, current_password, new_password)
+    invalidate_identity(username)
+    return success, message
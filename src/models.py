@@ -0,0 +1,280 @@
+"""
+Typed weather records.
+
+The weather service returns these NamedTuples instead of preformatted
+strings: measurements stay numeric (°C, %, m/s, hPa, metres) and times are
+Unix timestamps, so records are cheap to cache, compare and serialize
+(_asdict() for JSON snapshots). Display strings are built only when shown,
+through the properties and format_* helpers below.
+
+Failed lookups are still reported as {"error": message} dicts; see is_error().
+"""
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional
+
+# Enhanced weather emojis and conditions mapping
+WEATHER_EMOJIS = {
+    "clear": "☀️",
+    "clouds": "☁️",
+    "rain": "🌧️",
+    "drizzle": "🌦️",
+    "thunderstorm": "⛈️",
+    "snow": "❄️",
+    "mist": "🌫️",
+    "fog": "🌫️",
+    "haze": "🌫️",
+    "dust": "😷",
+    "smoke": "💨",
+    "tornado": "🌪️",
+    "default": "🌍"
+}
+
+# Weather recommendation mappings
+WEATHER_RECOMMENDATIONS = {
+    "clear": [
+        "Perfect weather for outdoor activities! 🎾",
+        "Don't forget your sunscreen! 🧴",
+        "Great time for a picnic! 🧺",
+        "Consider going for a hike! 🥾"
+    ],
+    "clouds": [
+        "Good conditions for outdoor photography! 📸",
+        "Nice weather for a walk! 🚶‍♂️",
+        "Perfect for outdoor cafes! ☕",
+        "Good day for sightseeing! 🏛️"
+    ],
+    "rain": [
+        "Visit a museum or gallery! 🏛️",
+        "Perfect for indoor shopping! 🛍️",
+        "Catch up on reading! 📚",
+        "Movie marathon weather! 🎬"
+    ],
+    "snow": [
+        "Build a snowman! ⛄",
+        "Go skiing or snowboarding! 🎿",
+        "Perfect for hot chocolate! ☕",
+        "Indoor board games day! 🎲"
+    ]
+}
+
+AIR_QUALITY_LABELS = {
+    1: "Good 😊",
+    2: "Fair 🙂",
+    3: "Moderate 😐",
+    4: "Poor 😷",
+    5: "Very Poor 🤢"
+}
+
+
+def is_error(result: Any) -> bool:
+    """Return True for an {"error": message} result instead of a record."""
+    return isinstance(result, dict) and "error" in result
+
+
+def format_temperature(celsius: float) -> str:
+    """Format a temperature, e.g. 21.34 -> "21.3°C"."""
+    return f"{round(celsius, 1)}°C"
+
+
+def format_percent(value: float) -> str:
+    """Format a percentage, e.g. 80 -> "80%"."""
+    return f"{round(value)}%"
+
+
+def format_speed(meters_per_second: float) -> str:
+    """Format a wind speed, e.g. 4.12 -> "4.1 m/s"."""
+    return f"{round(meters_per_second, 1)} m/s"
+
+
+def format_time(timestamp: float, pattern: str = '%H:%M') -> str:
+    """Format a Unix time in local time."""
+    return datetime.fromtimestamp(timestamp).strftime(pattern)
+
+
+def condition_emoji(condition: str) -> str:
+    """Return the emoji for a lower-case condition group such as "rain"."""
+    return WEATHER_EMOJIS.get(condition, WEATHER_EMOJIS["default"])
+
+
+def condition_recommendations(condition: str) -> List[str]:
+    """Return activity suggestions for a condition group (clear-weather ones by default)."""
+    return WEATHER_RECOMMENDATIONS.get(condition, WEATHER_RECOMMENDATIONS["clear"])
+
+
+class AirQuality(NamedTuple):
+    """OpenWeather air quality index, 1 (good) to 5 (very poor)."""
+    index: int
+
+    @property
+    def label(self) -> str:
+        return AIR_QUALITY_LABELS.get(self.index, "Unknown")
+
+
+class CurrentWeather(NamedTuple):
+    """Current conditions for one city."""
+    city: str
+    temperature: float  # °C
+    feels_like: float  # °C
+    humidity: int  # %
+    wind_speed: float  # m/s
+    wind_deg: float
+    condition: str  # Lower-case group, e.g. "rain"
+    description: str  # e.g. "light rain"
+    pressure: int  # hPa
+    visibility: Optional[float]  # Metres
+    sunrise: int  # Unix time
+    sunset: int  # Unix time
+    observed_at: Optional[int] = None  # Unix time of the upstream observation
+    air_quality_index: Optional[int] = None
+    stale_age: Optional[int] = None  # Seconds old, when served stale while refreshing
+    offline_as_of: Optional[float] = None  # Unix time of the snapshot, when served offline
+
+    @property
+    def condition_label(self) -> str:
+        return f"{condition_emoji(self.condition)} {self.description.capitalize()}"
+
+    @property
+    def recommendations(self) -> List[str]:
+        return condition_recommendations(self.condition)
+
+    @property
+    def air_quality(self) -> Optional[AirQuality]:
+        return AirQuality(self.air_quality_index) if self.air_quality_index is not None else None
+
+    def display(self) -> Dict[str, str]:
+        """Return the display strings for every measurement."""
+        formatted = {
+            "city": self.city,
+            "temperature": format_temperature(self.temperature),
+            "feels_like": format_temperature(self.feels_like),
+            "humidity": format_percent(self.humidity),
+            "wind_speed": format_speed(self.wind_speed),
+            "wind_direction": get_wind_direction(self.wind_deg),
+            "condition": self.condition_label,
+            "pressure": f"{self.pressure} hPa",
+            "visibility": f"{self.visibility / 1000:.1f} km" if self.visibility is not None else "n/a",
+            "sunrise": format_time(self.sunrise),
+            "sunset": format_time(self.sunset)
+        }
+        if self.air_quality is not None:
+            formatted["air_quality"] = self.air_quality.label
+        return formatted
+
+
+class ForecastHour(NamedTuple):
+    """One 3-hourly forecast entry, as cached from the API."""
+    time: int  # Unix time
+    temperature: float  # °C
+    condition: str  # Lower-case group, e.g. "rain"
+    humidity: float  # %
+    wind_speed: float  # m/s
+    pop: float = 0.0  # Probability of precipitation, 0-1
+
+    @property
+    def condition_label(self) -> str:
+        return f"{condition_emoji(self.condition)} {self.condition.capitalize()}"
+
+    def display(self) -> Dict[str, str]:
+        """Return the display strings for the entry."""
+        return {
+            "time": format_time(self.time),
+            "temperature": format_temperature(self.temperature),
+            "condition": self.condition_label,
+            "humidity": format_percent(self.humidity),
+            "wind_speed": format_speed(self.wind_speed),
+            "pop": format_percent(self.pop * 100)
+        }
+
+
+class ForecastDay(NamedTuple):
+    """Daily summary of a 3-hourly forecast."""
+    date: str  # 'YYYY-MM-DD'
+    temperature: float  # Mean °C
+    condition: str  # Most frequent lower-case group
+    humidity: float  # Mean %
+    wind_speed: float  # Mean m/s
+    temp_min: Optional[float] = None  # Lowest 3-hourly °C
+    temp_max: Optional[float] = None  # Highest 3-hourly °C
+
+    @property
+    def condition_label(self) -> str:
+        return f"{condition_emoji(self.condition)} {self.condition.capitalize()}"
+
+    @property
+    def recommendation(self) -> str:
+        return condition_recommendations(self.condition)[0]
+
+    def display(self) -> Dict[str, str]:
+        """Return the display strings for the day."""
+        formatted = {
+            "date": format_date(self.date),
+            "temperature": format_temperature(self.temperature),
+            "condition": self.condition_label,
+            "humidity": format_percent(self.humidity),
+            "wind_speed": format_speed(self.wind_speed),
+            "recommendations": self.recommendation
+        }
+        if self.temp_min is not None and self.temp_max is not None:
+            formatted["high_low"] = f"{format_temperature(self.temp_max)} / {format_temperature(self.temp_min)}"
+        return formatted
+
+
+def to_plain(value: Any) -> Any:
+    """Convert records (or lists of them) to JSON-serializable dicts."""
+    if hasattr(value, "_asdict"):
+        return to_plain(value._asdict())
+    if isinstance(value, (list, tuple)):
+        return [to_plain(item) for item in value]
+    if isinstance(value, dict):
+        return {key: to_plain(item) for key, item in value.items()}
+    return value
+
+
+def from_plain(record_type: type, value: Any) -> Any:
+    """
+    Rebuild records of record_type from to_plain() output.
+
+    Types with their own from_plain() classmethod (containers of records) use it.
+
+    Raises:
+        TypeError: If value does not match the record fields (e.g. an older format)
+    """
+    if hasattr(record_type, "from_plain"):
+        return record_type.from_plain(value)
+    if isinstance(value, list):
+        return [record_type(**item) for item in value]
+    return record_type(**value)
+
+
+def get_wind_direction(degrees: float) -> str:
+    """
+    Convert wind degrees to cardinal direction.
+
+    Args:
+        degrees (float): Wind direction in degrees
+
+    Returns:
+        str: Cardinal direction
+    """
+    directions = [
+        "North", "North-Northeast", "Northeast", "East-Northeast",
+        "East", "East-Southeast", "Southeast", "South-Southeast",
+        "South", "South-Southwest", "Southwest", "West-Southwest",
+        "West", "West-Northwest", "Northwest", "North-Northwest"
+    ]
+    index = round(degrees / (360 / len(directions))) % len(directions)
+    return directions[index]
+
+
+def format_date(date_str: str) -> str:
+    """
+    Format date string to more readable format.
+
+    Args:
+        date_str (str): Date string in YYYY-MM-DD format
+
+    Returns:
+        str: Formatted date string
+    """
+    date_obj = datetime.strptime(date_str, '%Y-%m-%d')
+    return date_obj.strftime('%A, %B %d')  # e.g., "Monday, January 15"
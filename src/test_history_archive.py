@@ -0,0 +1,100 @@
+"""
+Compact weather history into the Parquet archive while other writers commit.
+
+The export callback writes and flushes history on another connection,
+as the history buffer does in a running app, so compaction has to cope
+with commits that land between reading a partition and dropping it.
+
+Run with: python -m pytest test_history_archive.py
+"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+import database
+import history_archive
+import history_partitions
+
+
+def _month_start(months_ago):
+    """Return 10 days into the month months_ago months before now (UTC)."""
+    day = datetime.now(timezone.utc).replace(day=1)
+    for _ in range(months_ago):
+        day = (day - timedelta(days=1)).replace(day=1)
+    return day + timedelta(days=9)
+
+
+def _save(city, when, temperature=10.0):
+    """Queue one observation and write it through the history buffer."""
+    database.save_weather_data(city, temperature, "clear", when.timestamp())
+    return database.flush_weather_data()
+
+
+def _partitions():
+    conn = database.connect_db()
+    try:
+        return history_partitions.list_partitions(conn.cursor())
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def history_db(tmp_path, monkeypatch):
+    """An empty database with six readings in each of two months older than HOT_DAYS."""
+    monkeypatch.setattr(database, "DB_FILE", str(tmp_path / "weather.db"))
+    monkeypatch.setattr(database, "_history_buffer", database.WeatherHistoryBuffer())
+    database.init_db()
+
+    old_months = [_month_start(8), _month_start(7)]
+    for start in old_months:
+        for hour in range(6):
+            _save("London", start + timedelta(hours=hour))
+    yield tmp_path / "archive", old_months
+    database._history_buffer.close()
+
+
+def test_compaction_survives_concurrent_writes(history_db, monkeypatch):
+    archive_dir, old_months = history_db
+    write_month = history_archive._write_month
+    recent = datetime.now(timezone.utc) - timedelta(hours=1)
+    exported = []
+
+    def export_while_writing(directory, month, rows):
+        write_month(directory, month, rows)
+        exported.append(month)
+        # Another connection commits between the export and the drop
+        assert _save("Paris", recent - timedelta(hours=len(exported))) == 1
+
+    monkeypatch.setattr(history_archive, "_write_month", export_while_writing)
+    months = history_archive.compact_history(archive_dir=str(archive_dir))
+
+    assert months == [start.strftime('%Y-%m') for start in old_months]
+    current = {history_partitions.partition_name((recent - timedelta(hours=hours)).strftime('%Y-%m-%d %H:%M:%S'))
+               for hours in (1, 2)}
+    assert set(_partitions()) <= current
+    assert len(history_archive.load_history(["London"], archive_dir=str(archive_dir))) == 12
+    assert len(history_archive.load_history(["Paris"], archive_dir=str(archive_dir))) == 2
+
+
+def test_rows_written_to_an_archived_month_are_kept(history_db, monkeypatch):
+    archive_dir, old_months = history_db
+    write_month = history_archive._write_month
+    late = old_months[0] + timedelta(days=1)
+
+    def export_with_late_row(directory, month, rows):
+        write_month(directory, month, rows)
+        if month == old_months[0].strftime('%Y-%m') and len(rows) == 6:
+            assert _save("London", late) == 1
+
+    monkeypatch.setattr(history_archive, "_write_month", export_with_late_row)
+    assert history_archive.compact_history(archive_dir=str(archive_dir)) == [old_months[1].strftime('%Y-%m')]
+    assert _partitions() == [history_partitions.partition_name(late.strftime('%Y-%m-%d %H:%M:%S'))]
+
+    # The next run exports the month again, late row included, without duplicates
+    assert history_archive.compact_history(archive_dir=str(archive_dir)) == [old_months[0].strftime('%Y-%m')]
+    assert _partitions() == []
+    history = history_archive.load_history(["London"], archive_dir=str(archive_dir))
+    assert len(history) == 13
+    assert not history.duplicated(["city", "recorded_at"]).any()
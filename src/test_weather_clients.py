@@ -0,0 +1,230 @@
+"""
+Compare the synchronous and async weather clients against a local stub server.
+
+The stub stands in for OpenWeather through OPENWEATHER_API_ROOT: "London"
+answers normally, "Nowhere" returns 404 and "Down" returns 503. Each client
+runs against its own empty database and caches, and both must return the
+same records and error dictionaries, including when an expired entry is
+served stale while it refreshes.
+
+Run with: python -m pytest test_weather_clients.py
+"""
+import os
+import json
+import time
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+WEATHER = {
+    "name": "London",
+    "coord": {"lat": 51.51, "lon": -0.13},
+    "main": {"temp": 12.5, "feels_like": 11.0, "humidity": 80, "pressure": 1012},
+    "wind": {"speed": 4.1, "deg": 250},
+    "weather": [{"main": "Rain", "description": "light rain"}],
+    "visibility": 10000,
+    "sys": {"country": "GB", "sunrise": 1700000000, "sunset": 1700030000},
+    "dt": 1700010000
+}
+
+FORECAST = {
+    "city": {"name": "London", "country": "GB", "coord": {"lat": 51.51, "lon": -0.13}},
+    "list": [
+        {
+            "dt": 1700006400 + i * 10800,
+            "main": {"temp": 10 + i % 5, "humidity": 70 + i % 3},
+            "weather": [{"main": "Clouds" if i % 4 else "Rain"}],
+            "wind": {"speed": 3.0 + i % 2},
+            "pop": 0.2
+        }
+        for i in range(40)
+    ]
+}
+
+AIR_QUALITY = {"list": [{"main": {"aqi": 2}}]}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Serve canned OpenWeather responses chosen by the requested city."""
+
+    requests = []
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        StubHandler.requests.append((url.path, query))
+
+        city = query.get("q", "London").split(",")[0]
+        if city == "Nowhere":
+            self._send(404, {"cod": "404", "message": "city not found"})
+        elif city == "Down":
+            self._send(503, {"cod": 503, "message": "unavailable"})
+        elif url.path.endswith("/weather"):
+            self._send(200, WEATHER)
+        elif url.path.endswith("/forecast"):
+            self._send(200, FORECAST)
+        elif url.path.endswith("/air_pollution"):
+            self._send(200, AIR_QUALITY)
+        else:
+            self._send(404, {"message": "unknown endpoint"})
+
+    def _send(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# The stub must be listening before weather_service reads OPENWEATHER_API_ROOT
+_server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+threading.Thread(target=_server.serve_forever, daemon=True).start()
+os.environ["OPENWEATHER_API_ROOT"] = f"http://127.0.0.1:{_server.server_address[1]}"
+os.environ.setdefault("OPENWEATHER_API_KEY", "test-key")
+os.environ["OPENWEATHER_BACKOFF_BASE"] = "0.01"
+
+import database
+import weather_service
+import async_weather_service
+from http_client import get_client
+from models import is_error
+
+
+def _reset(db_file):
+    """Point the service at an empty database and drop every in-memory cache."""
+    database.DB_FILE = str(db_file)
+    database.init_db()
+    weather_service.clear_cache()
+    weather_service._locations.clear()
+    get_client().breakers.reset()
+    StubHandler.requests.clear()
+
+
+def _run_sync():
+    return {
+        "weather": weather_service.get_weather("London"),
+        "not_found": weather_service.get_weather("Nowhere"),
+        "unavailable": weather_service.get_weather("Down"),
+        "forecast": weather_service.get_forecast("London"),
+        "forecast_unavailable": weather_service.get_forecast("Down"),
+        "air_quality": weather_service.get_air_quality(51.51, -0.13)
+    }
+
+
+async def _run_async():
+    async with async_weather_service.AsyncWeatherClient() as client:
+        return {
+            "weather": await client.get_weather("London"),
+            "not_found": await client.get_weather("Nowhere"),
+            "unavailable": await client.get_weather("Down"),
+            "forecast": await client.get_forecast("London"),
+            "forecast_unavailable": await client.get_forecast("Down"),
+            "air_quality": await client.get_air_quality(51.51, -0.13)
+        }
+
+
+@pytest.fixture(scope="module")
+def results(tmp_path_factory):
+    """Results of the same calls through both clients, each from a cold start."""
+    db_file = database.DB_FILE
+    tmp_path = tmp_path_factory.mktemp("clients")
+    try:
+        _reset(tmp_path / "sync.db")
+        sync_results = _run_sync()
+        sync_requests = list(StubHandler.requests)
+
+        _reset(tmp_path / "async.db")
+        async_results = asyncio.run(_run_async())
+        async_requests = list(StubHandler.requests)
+    finally:
+        database.DB_FILE = db_file
+        weather_service.clear_cache()
+        weather_service._locations.clear()
+        get_client().breakers.reset()
+    return sync_results, async_results, sync_requests, async_requests
+
+
+def test_both_clients_reach_the_stub(results):
+    _, _, sync_requests, async_requests = results
+    for requests in (sync_requests, async_requests):
+        paths = {path for path, _ in requests}
+        assert paths == {"/data/2.5/weather", "/data/2.5/forecast", "/data/2.5/air_pollution"}
+
+
+def test_records_match(results):
+    sync_results, async_results, _, _ = results
+    for key in ("weather", "forecast", "air_quality"):
+        assert not is_error(sync_results[key])
+        assert sync_results[key] == async_results[key]
+
+    weather = sync_results["weather"]
+    assert weather.city == "London"
+    assert weather.air_quality_index == 2
+    assert len(sync_results["forecast"]) == 5
+
+
+def test_not_found_error_matches(results):
+    sync_results, async_results, _, _ = results
+    assert sync_results["not_found"] == {"error": "City 'Nowhere' not found"}
+    assert async_results["not_found"] == sync_results["not_found"]
+
+
+def test_unavailable_errors_match(results):
+    sync_results, async_results, _, _ = results
+    for key, prefix in (("unavailable", "Error fetching weather data: "),
+                        ("forecast_unavailable", "Error fetching forecast data: ")):
+        for result in (sync_results[key], async_results[key]):
+            assert is_error(result)
+            assert result["error"].startswith(prefix)
+            assert "503" in result["error"]
+
+
+def test_unavailable_is_retried(results):
+    _, _, sync_requests, async_requests = results
+    for requests in (sync_requests, async_requests):
+        down = [query for path, query in requests if path == "/data/2.5/weather" and query.get("q") == "Down"]
+        assert len(down) == get_client().max_retries + 1
+
+
+async def _get_weather_async(city):
+    async with async_weather_service.AsyncWeatherClient() as client:
+        return await client.get_weather(city)
+
+
+def test_stale_entries_match(results, tmp_path):
+    sync_results, _, _, _ = results
+    cache = weather_service._caches["weather"]
+    db_file = database.DB_FILE
+    weather_service.configure_stale_while_revalidate(True)
+    try:
+        served = {}
+        for name, get in (("sync", weather_service.get_weather),
+                          ("async", lambda city: asyncio.run(_get_weather_async(city)))):
+            # A first fetch geocodes the city, so the entry is kept under its coordinates
+            _reset(tmp_path / f"{name}.db")
+            assert get("London") == sync_results["weather"]
+            cache_key = weather_service.coord_key(51.51, -0.13)
+            cache.set(cache_key, sync_results["weather"], age=cache.ttl + 60)
+            served[name] = get("London")
+
+            # The stale entry is refreshed in the background
+            deadline = time.monotonic() + 5
+            while cache.lookup(cache_key)[1] >= cache.ttl and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert cache.lookup(cache_key)[1] < cache.ttl
+    finally:
+        weather_service.configure_stale_while_revalidate(weather_service.STALE_WHILE_REVALIDATE)
+        database.DB_FILE = db_file
+        weather_service.clear_cache()
+        weather_service._locations.clear()
+
+    for weather in served.values():
+        assert weather.stale_age >= 60
+        assert weather._replace(stale_age=None) == sync_results["weather"]
@@ -1,9 +1,18 @@
 import requests
 import os
+import json
+import time
 from dotenv import load_dotenv
 from datetime import datetime
 import logging
-from typing import Dict, List, Union
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from cache import SingleFlight, TTLCache
+from models import AirQuality, CurrentWeather, ForecastDay, ForecastHour, from_plain, is_error, to_plain
+from forecast_aggregation import Forecast, aggregate_daily
+from http_client import PLAN_MAX_RPS, TokenBucket, get_client, rate_limited
+from database import get_city_location, save_city_location, get_weather_snapshot, save_weather_snapshot
 
 # Configure logging
 logging.basicConfig(
@@ -18,58 +27,60 @@ API_KEY = os.getenv('OPENWEATHER_API_KEY')
 if not API_KEY:
     raise ValueError("OpenWeather API key not found in environment variables!")
 
-# API endpoints
-BASE_URL = "https://api.openweathermap.org/data/2.5/weather"
-FORECAST_URL = "https://api.openweathermap.org/data/2.5/forecast"
-AIR_QUALITY_URL = "https://api.openweathermap.org/data/2.5/air_pollution"
-
-# Enhanced weather emojis and conditions mapping
-WEATHER_EMOJIS = {
-    "clear": "☀️",
-    "clouds": "☁️",
-    "rain": "🌧️",
-    "drizzle": "🌦️",
-    "thunderstorm": "⛈️",
-    "snow": "❄️",
-    "mist": "🌫️",
-    "fog": "🌫️",
-    "haze": "🌫️",
-    "dust": "😷",
-    "smoke": "💨",
-    "tornado": "🌪️",
-    "default": "🌍"
+# API endpoints (the root can point at a local stub server for testing)
+API_ROOT = os.getenv('OPENWEATHER_API_ROOT', "https://api.openweathermap.org").rstrip('/')
+BASE_URL = f"{API_ROOT}/data/2.5/weather"
+FORECAST_URL = f"{API_ROOT}/data/2.5/forecast"
+AIR_QUALITY_URL = f"{API_ROOT}/data/2.5/air_pollution"
+
+# Response cache settings (seconds); OpenWeather refreshes current data roughly every 10 minutes
+CACHE_TTLS = {
+    "weather": float(os.getenv('WEATHER_CACHE_TTL', 600)),
+    "forecast": float(os.getenv('FORECAST_CACHE_TTL', 1800)),
+    "air_quality": float(os.getenv('AIR_QUALITY_CACHE_TTL', 1800))
 }
+CACHE_MAX_ENTRIES = int(os.getenv('WEATHER_CACHE_MAX_ENTRIES', 512))
 
-# Weather recommendation mappings
-WEATHER_RECOMMENDATIONS = {
-    "clear": [
-        "Perfect weather for outdoor activities! 🎾",
-        "Don't forget your sunscreen! 🧴",
-        "Great time for a picnic! 🧺",
-        "Consider going for a hike! 🥾"
-    ],
-    "clouds": [
-        "Good conditions for outdoor photography! 📸",
-        "Nice weather for a walk! 🚶‍♂️",
-        "Perfect for outdoor cafes! ☕",
-        "Good day for sightseeing! 🏛️"
-    ],
-    "rain": [
-        "Visit a museum or gallery! 🏛️",
-        "Perfect for indoor shopping! 🛍️",
-        "Catch up on reading! 📚",
-        "Movie marathon weather! 🎬"
-    ],
-    "snow": [
-        "Build a snowman! ⛄",
-        "Go skiing or snowboarding! 🎿",
-        "Perfect for hot chocolate! ☕",
-        "Indoor board games day! 🎲"
-    ]
+# Stale-while-revalidate: serve expired entries (up to MAX_STALE seconds past their
+# TTL) immediately, flagged as stale, while a background refresh updates them
+STALE_WHILE_REVALIDATE = os.getenv('WEATHER_STALE_WHILE_REVALIDATE', 'false').lower() in ('1', 'true', 'yes')
+MAX_STALE = float(os.getenv('WEATHER_MAX_STALE', 3600))
+
+_caches = {
+    endpoint: TTLCache(ttl, CACHE_MAX_ENTRIES, MAX_STALE if STALE_WHILE_REVALIDATE else 0)
+    for endpoint, ttl in CACHE_TTLS.items()
+}
+
+# Record type persisted in snapshots of each endpoint
+SNAPSHOT_TYPES = {
+    "weather": CurrentWeather,
+    "forecast": Forecast,
+    "air_quality": AirQuality
 }
 
+# Concurrent cache misses for the same key share one upstream request
+_flights = SingleFlight()
+
+# Background refreshes currently queued or running, by flight key
+_revalidating = set()
+_revalidating_lock = threading.Lock()
+
+# In-memory layer over the city_locations table: normalized query -> canonical
+# name and coordinates, learned from earlier responses
+LOCATION_CACHE_TTL = 24 * 60 * 60
+_locations = TTLCache(LOCATION_CACHE_TTL, 4096)
 
-def get_weather(city: str) -> Dict[str, Union[str, float]]:
+# Worker pool used to fan out independent requests in get_city_report
+REPORT_WORKERS = int(os.getenv('WEATHER_REPORT_WORKERS', 8))
+_executor = ThreadPoolExecutor(max_workers=REPORT_WORKERS, thread_name_prefix="weather")
+# Snapshot writes get their own single thread, so they queue behind each other
+# instead of taking pool workers from get_city_report
+_snapshot_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="weather-snapshot")
+
+# Default parallelism for bulk refreshes of many cities
+REFRESH_CONCURRENCY = int(os.getenv('WEATHER_REFRESH_CONCURRENCY', 16))
+
+def get_weather(city: str) -> Union[CurrentWeather, Dict[str, str]]:
     """
     Fetch detailed current weather data for a given city.
 
@@ -77,64 +88,195 @@ def get_weather(city: str) -> Dict[str, Union[str, float]]:
         city (str): Name of the city
 
     Returns:
-        dict: Weather data including temperature, humidity, wind speed, etc.
+        CurrentWeather: Temperature, humidity, wind, condition, etc., or an error dict
     """
-    params = {
-        "q": city,
-        "appid": API_KEY,
-        "units": "metric"
+    location = resolve_city(city)
+    cache_key = _location_key(city, location)
+    cached = _serve_cached("weather", cache_key, _load_weather, city, location)
+    if cached is not None:
+        logger.info(f"Using cached weather data for {city}")
+        return cached
+
+    return _flights.do(("weather", cache_key), _load_weather, city, location)
+
+
+def get_city_report(city: str, days: int = 7) -> Dict[str, Union[str, Dict, List, CurrentWeather]]:
+    """
+    Fetch current weather, forecast and air quality for a city concurrently.
+
+    The forecast and, when the city's coordinates are already known, the air
+    quality request run on the shared worker pool while the current weather is
+    fetched, so the total latency is that of the slowest call.
+
+    Args:
+        city (str): Name of the city
+        days (int): Number of days for forecast (default 7)
+
+    Returns:
+        dict: "city", "current" (as get_weather), "forecast" (as get_forecast),
+        "hourly" (next 24 hours, as get_hourly_forecast; both come from one
+        cached forecast), "air_quality" (AirQuality or None), "stale_age" (age
+        in seconds of each section served stale in stale-while-revalidate
+        mode, else None) and "offline_as_of" (Unix time of the last-known-good
+        snapshot served while offline, else None)
+    """
+    location = resolve_city(city)
+    cache_key = _location_key(city, location)
+    forecast_future = _executor.submit(_get_forecast_entry, city, days)
+
+    current = _serve_cached("weather", cache_key, _load_weather, city, location)
+    if current is None:
+        air_quality_future = None
+        if location:
+            air_quality_future = _executor.submit(get_air_quality, location["lat"], location["lon"])
+
+        current = _flights.do(("weather", cache_key), _load_weather, city, location, air_quality_future)
+    else:
+        logger.info(f"Using cached weather data for {city}")
+
+    forecast_data, forecast_stale_age = forecast_future.result()
+    forecast, hourly = _daily_view(forecast_data), _hourly_view(forecast_data, 24)
+    if is_error(current):
+        return {
+            "city": city,
+            "current": current,
+            "forecast": forecast,
+            "hourly": hourly,
+            "air_quality": None,
+            "stale_age": {"current": None, "forecast": forecast_stale_age},
+            "offline_as_of": None
+        }
+    return {
+        "city": current.city,
+        "current": current,
+        "forecast": forecast,
+        "hourly": hourly,
+        "air_quality": current.air_quality,
+        "stale_age": {"current": current.stale_age, "forecast": forecast_stale_age},
+        "offline_as_of": current.offline_as_of
     }
 
+
+def refresh_cities(cities: Iterable[str], max_rps: float = PLAN_MAX_RPS,
+                   concurrency: int = REFRESH_CONCURRENCY) -> Iterator[Tuple[str, Union[CurrentWeather, Dict]]]:
+    """
+    Refresh current weather for many cities in parallel, yielding results as they complete.
+
+    City names are deduplicated by their cached location (or normalized name),
+    so favorites shared by many users are fetched once. Upstream requests made by the refresh (including
+    air quality lookups) draw from a token bucket so the plan's rate limit is
+    respected; cached cities cost no tokens.
+
+    Args:
+        cities (iterable): City names, e.g. every user's favorites
+        max_rps (float): Maximum upstream requests per second
+        concurrency (int): Number of worker threads
+
+    Yields:
+        tuple: (city, CurrentWeather or error dict) in completion order
+    """
+    unique_cities = {}
+    for city in cities:
+        unique_cities.setdefault(_location_key(city, resolve_city(city)), city)
+
+    limiter = TokenBucket(max_rps)
+
+    def refresh(city):
+        with rate_limited(limiter):
+            return get_weather(city)
+
+    logger.info(f"Refreshing {len(unique_cities)} cities at up to {max_rps} requests/s")
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="weather-refresh")
+    try:
+        futures = {executor.submit(refresh, city): city for city in unique_cities.values()}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _load_weather(city: str, location: Optional[Dict], air_quality_future=None) -> Union[CurrentWeather, Dict]:
+    """
+    Fetch current weather plus air quality and cache the merged result.
+
+    Args:
+        city (str): Name of the city
+        location (dict): Cached location, if the city was resolved before
+        air_quality_future (Future): Air quality request already in progress, if any
+
+    Returns:
+        CurrentWeather: Weather data, or an error dict
+    """
+    # After a restart, a persisted response that is still fresh saves the fetch
+    restored = _warm_from_snapshot("weather", _location_key(city, location))
+    if restored is not None:
+        return restored
+
+    weather_info, location = _fetch_current_weather(city, location)
+    if location is None:
+        return weather_info
+
+    # Add air quality data if available
+    if air_quality_future is not None:
+        air_quality = air_quality_future.result()
+    else:
+        air_quality = get_air_quality(location["lat"], location["lon"])
+    return _finish_weather(_location_key(city, location), weather_info, air_quality)
+
+
+def _fetch_current_weather(city: str, location: Optional[Dict] = None) -> Tuple[Union[CurrentWeather, Dict],
+                                                                                Optional[Dict]]:
+    """
+    Fetch and format current weather for a city, without air quality.
+
+    Args:
+        city (str): Name of the city
+        location (dict): Cached location; queried by coordinates when given
+
+    Returns:
+        tuple: (weather info or error dict, location or None on error)
+    """
     try:
         logger.info(f"Fetching weather data for {city}")
-        response = requests.get(BASE_URL, params=params, timeout=10)
-        response.raise_for_status()
-        data = response.json()
+        response = get_client().get(BASE_URL, _weather_params(city, location), endpoint="weather")
 
-        # Extract weather condition
-        condition = data["weather"][0]["main"].lower()
-        emoji = WEATHER_EMOJIS.get(condition, WEATHER_EMOJIS["default"])
-
-        # Get weather recommendations
-        recommendations = WEATHER_RECOMMENDATIONS.get(condition,
-                                                      WEATHER_RECOMMENDATIONS.get(
-                                                          "clear"))  # Default to clear weather recommendations
-
-        # Process and format weather data
-        weather_info = {
-            "city": data["name"],
-            "temperature": f"{round(data['main']['temp'], 1)}°C",
-            "feels_like": f"{round(data['main']['feels_like'], 1)}°C",
-            "humidity": f"{data['main']['humidity']}%",
-            "wind_speed": f"{round(data['wind']['speed'], 1)} m/s",
-            "wind_direction": get_wind_direction(data['wind'].get('deg', 0)),
-            "condition": f"{emoji} {data['weather'][0]['description'].capitalize()}",
-            "pressure": f"{data['main']['pressure']} hPa",
-            "visibility": f"{data['visibility'] / 1000:.1f} km",
-            "sunrise": datetime.fromtimestamp(data['sys']['sunrise']).strftime('%H:%M'),
-            "sunset": datetime.fromtimestamp(data['sys']['sunset']).strftime('%H:%M'),
-            "recommendations": recommendations,
-            "raw_temp": data['main']['temp'],  # For calculations
-            "raw_condition": condition  # For calculations
-        }
+        status_error = _weather_status_error(response.status_code, city)
+        if status_error:
+            return status_error, None
 
-        # Add air quality data if available
-        air_quality = get_air_quality(data['coord']['lat'], data['coord']['lon'])
-        if air_quality:
-            weather_info.update(air_quality)
+        response.raise_for_status()
+        data = response.json()
+        weather_info, coord = _parse_weather(data)
+        weather_info, location = _apply_location(city, location, weather_info, data, coord)
 
         logger.info(f"Successfully retrieved weather data for {city}")
-        return weather_info
+        return weather_info, location
 
+    except requests.exceptions.ConnectionError:
+        logger.error(f"Connection error fetching weather data for {city}")
+        error = {"error": "Connection error. Please check your internet."}
+        return _offline_fallback("weather", _location_key(city, location), error), None
     except requests.exceptions.RequestException as e:
         logger.error(f"Error fetching weather data for {city}: {str(e)}")
-        return {"error": f"Error fetching weather data: {str(e)}"}
+        error = {"error": f"Error fetching weather data: {str(e)}"}
+        return _offline_fallback("weather", _location_key(city, location), error), None
     except (KeyError, ValueError) as e:
         logger.error(f"Error processing weather data for {city}: {str(e)}")
-        return {"error": f"Error processing weather data: {str(e)}"}
+        return {"error": f"Error processing weather data: {str(e)}"}, None
+
+
+def _finish_weather(cache_key: str, weather_info: CurrentWeather,
+                    air_quality: Optional[AirQuality]) -> CurrentWeather:
+    """Merge air quality into freshly fetched weather info and cache the result."""
+    if air_quality is not None:
+        weather_info = weather_info._replace(air_quality_index=air_quality.index)
 
+    _caches["weather"].set(cache_key, weather_info)
+    _store_snapshot("weather", cache_key, weather_info)
+    return weather_info
 
-def get_forecast(city: str, days: int = 7) -> List[Dict[str, str]]:
+
+def get_forecast(city: str, days: int = 7) -> Union[List[ForecastDay], Dict[str, str]]:
     """
     Fetch detailed weather forecast for specified number of days.
 
@@ -143,75 +285,182 @@ def get_forecast(city: str, days: int = 7) -> List[Dict[str, str]]:
         days (int): Number of days for forecast (default 7)
 
     Returns:
-        list: List of dictionaries containing forecast data
+        list: One ForecastDay per day (mean, low and high temperature), or an error dict
     """
-    params = {
-        "q": city,
-        "appid": API_KEY,
-        "units": "metric",
-        "cnt": days * 8  # API returns data in 3-hour intervals
-    }
+    return _daily_view(get_forecast_data(city, days))
 
-    try:
-        logger.info(f"Fetching {days}-day forecast for {city}")
-        response = requests.get(FORECAST_URL, params=params, timeout=10)
-        response.raise_for_status()
-        data = response.json()
 
-        # Process forecast data
-        forecast = []
-        daily_data = {}
-
-        for item in data['list']:
-            date = item['dt_txt'].split(' ')[0]
-
-            if date not in daily_data:
-                daily_data[date] = {
-                    'temps': [],
-                    'conditions': [],
-                    'humidity': [],
-                    'wind_speed': []
-                }
-
-            daily_data[date]['temps'].append(item['main']['temp'])
-            daily_data[date]['conditions'].append(item['weather'][0]['main'].lower())
-            daily_data[date]['humidity'].append(item['main']['humidity'])
-            daily_data[date]['wind_speed'].append(item['wind']['speed'])
-
-        # Calculate daily averages and most common condition
-        for date, day_data in daily_data.items():
-            avg_temp = sum(day_data['temps']) / len(day_data['temps'])
-            most_common_condition = max(set(day_data['conditions']),
-                                        key=day_data['conditions'].count)
-            avg_humidity = sum(day_data['humidity']) / len(day_data['humidity'])
-            avg_wind = sum(day_data['wind_speed']) / len(day_data['wind_speed'])
-
-            emoji = WEATHER_EMOJIS.get(most_common_condition, WEATHER_EMOJIS["default"])
-
-            forecast.append({
-                "date": format_date(date),
-                "temperature": f"{round(avg_temp, 1)}°C",
-                "condition": f"{emoji} {most_common_condition.capitalize()}",
-                "humidity": f"{round(avg_humidity)}%",
-                "wind_speed": f"{round(avg_wind, 1)} m/s",
-                "recommendations": WEATHER_RECOMMENDATIONS.get(
-                    most_common_condition,
-                    WEATHER_RECOMMENDATIONS["clear"]
-                )[0]  # Get first recommendation
-            })
-
-        logger.info(f"Successfully retrieved forecast data for {city}")
-        return forecast
+def get_hourly_forecast(city: str, hours: int = 24, days: int = 7) -> Union[List[ForecastHour], Dict[str, str]]:
+    """
+    Fetch the 3-hourly forecast entries for the next hours.
+
+    Served from the same cached forecast as get_forecast(city, days), so it
+    costs no extra API call.
+
+    Args:
+        city (str): Name of the city
+        hours (int): Hours ahead to include (default 24)
+        days (int): Forecast length the cached entry was requested with
+
+    Returns:
+        list: ForecastHour entries, or an error dict
+    """
+    return _hourly_view(get_forecast_data(city, days), hours)
+
+
+def get_forecast_data(city: str, days: int = 7) -> Union[Forecast, Dict[str, str]]:
+    """
+    Fetch the raw 3-hourly forecast, cached once per city and length.
+
+    Its hourly(), daily() and highs_lows() views are derived from the cached
+    entries on demand.
+
+    Args:
+        city (str): Name of the city
+        days (int): Number of days for forecast (default 7)
+
+    Returns:
+        Forecast: Forecast entries, or an error dict
+    """
+    return _get_forecast_entry(city, days)[0]
+
+
+def _daily_view(forecast: Union[Forecast, Dict]) -> Union[List[ForecastDay], Dict]:
+    return forecast if is_error(forecast) else forecast.daily()
+
+
+def _hourly_view(forecast: Union[Forecast, Dict], hours: int) -> Union[List[ForecastHour], Dict]:
+    return forecast if is_error(forecast) else forecast.hourly(hours)
+
+
+def _get_forecast_entry(city: str, days: int) -> Tuple[Union[Forecast, Dict], Optional[int]]:
+    """Return (forecast, its age in seconds if served stale else None)."""
+    location = resolve_city(city)
+    cache_key = (_location_key(city, location), days)
+    entry = _caches["forecast"].lookup(cache_key)
+    if entry is not None:
+        forecast, age = entry
+        logger.info(f"Using cached forecast for {city}")
+        return forecast, _stale_age("forecast", ("forecast",) + cache_key, age, _load_forecast, city, days, location)
+
+    return _flights.do(("forecast",) + cache_key, _load_forecast, city, days, location), None
+
+
+def _load_forecast(city: str, days: int, location: Optional[Dict]) -> Union[Forecast, Dict]:
+    """Fetch, parse and cache a forecast (see get_forecast)."""
+    restored = _warm_from_snapshot("forecast", (_location_key(city, location), days))
+    if restored is not None:
+        return restored
+
+    try:
+        data, location = _fetch_forecast_payload(city, days, location)
+        return _cache_forecast(city, days, location, _parse_forecast(data))
 
     except requests.exceptions.RequestException as e:
         logger.error(f"Error fetching forecast for {city}: {str(e)}")
-        return {"error": f"Error fetching forecast data: {str(e)}"}
+        error = {"error": f"Error fetching forecast data: {str(e)}"}
+        return _offline_fallback("forecast", (_location_key(city, location), days), error)
     except (KeyError, ValueError) as e:
         logger.error(f"Error processing forecast for {city}: {str(e)}")
         return {"error": f"Error processing forecast data: {str(e)}"}
 
 
-def get_air_quality(lat: float, lon: float) -> Dict[str, str]:
+def _fetch_forecast_payload(city: str, days: int, location: Optional[Dict]) -> Tuple[Dict, Optional[Dict]]:
+    """
+    Request a raw forecast.
+
+    Returns:
+        tuple: (decoded /forecast response, location)
+
+    Raises:
+        requests.exceptions.RequestException: If the request failed
+    """
+    logger.info(f"Fetching {days}-day forecast for {city}")
+    response = get_client().get(FORECAST_URL, _forecast_params(city, days, location), endpoint="forecast")
+    response.raise_for_status()
+    data = response.json()
+    return data, location or _remember_forecast_location(city, data)
+
+
+def _cache_forecast(city: str, days: int, location: Optional[Dict], forecast: Forecast) -> Forecast:
+    """Cache and snapshot a freshly parsed forecast."""
+    cache_key = (_location_key(city, location), days)
+    _caches["forecast"].set(cache_key, forecast)
+    _store_snapshot("forecast", cache_key, forecast)
+    logger.info(f"Successfully retrieved forecast data for {city}")
+    return forecast
+
+
+def refresh_forecasts(cities: Iterable[str], days: int = 7, max_rps: float = PLAN_MAX_RPS,
+                      concurrency: int = REFRESH_CONCURRENCY) -> Dict[str, Union[List[ForecastDay], Dict]]:
+    """
+    Precompute forecasts for many cities, e.g. every user's favorites.
+
+    Cities are deduplicated like refresh_cities() and cached forecasts are
+    reused. The rest are fetched in parallel under the plan's rate limit, and
+    the daily views of all fetched forecasts are aggregated in one vectorized call.
+
+    Args:
+        cities (iterable): City names
+        days (int): Number of days for forecast (default 7)
+        max_rps (float): Maximum upstream requests per second
+        concurrency (int): Number of worker threads
+
+    Returns:
+        dict: City -> list of ForecastDay (as get_forecast), or an error dict
+    """
+    unique_cities = {}
+    for city in cities:
+        location = resolve_city(city)
+        unique_cities.setdefault(_location_key(city, location), (city, location))
+
+    results = {}
+    missing = []
+    for key, (city, location) in unique_cities.items():
+        cached = _caches["forecast"].get((key, days))
+        if cached is not None:
+            results[city] = cached.daily()
+        else:
+            missing.append((city, location))
+
+    limiter = TokenBucket(max_rps)
+
+    def fetch(city, location):
+        with rate_limited(limiter):
+            return _fetch_forecast_payload(city, days, location)
+
+    logger.info(f"Refreshing forecasts for {len(missing)} of {len(unique_cities)} cities at up to {max_rps} requests/s")
+    fetched = []
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="forecast-refresh") as executor:
+        futures = {executor.submit(fetch, city, location): (city, location) for city, location in missing}
+        for future in as_completed(futures):
+            city, location = futures[future]
+            try:
+                data, location = future.result()
+                fetched.append((city, location, data))
+            except requests.exceptions.RequestException as e:
+                logger.error(f"Error fetching forecast for {city}: {str(e)}")
+                error = {"error": f"Error fetching forecast data: {str(e)}"}
+                results[city] = _daily_view(_offline_fallback("forecast", (_location_key(city, location), days), error))
+            except ValueError as e:
+                logger.error(f"Error processing forecast for {city}: {str(e)}")
+                results[city] = {"error": f"Error processing forecast data: {str(e)}"}
+
+    parsed = []
+    for city, location, data in fetched:
+        try:
+            parsed.append((city, location, _parse_forecast(data)))
+        except (KeyError, ValueError, IndexError) as e:
+            logger.error(f"Error processing forecast for {city}: {str(e)}")
+            results[city] = {"error": f"Error processing forecast data: {str(e)}"}
+
+    aggregate_daily([forecast for _, _, forecast in parsed])
+    for city, location, forecast in parsed:
+        results[city] = _cache_forecast(city, days, location, forecast).daily()
+    return results
+
+
+def get_air_quality(lat: float, lon: float) -> Optional[AirQuality]:
     """
     Fetch air quality data for given coordinates.
 
@@ -220,69 +469,425 @@ def get_air_quality(lat: float, lon: float) -> Dict[str, str]:
         lon (float): Longitude
 
     Returns:
-        dict: Air quality data
+        AirQuality: Air quality index, or None if unavailable
     """
-    params = {
+    cache_key = coord_key(lat, lon)
+    cached = _caches["air_quality"].get(cache_key)
+    if cached is not None:
+        return cached
+
+    return _flights.do(("air_quality", cache_key), _load_air_quality, lat, lon, cache_key)
+
+
+def _load_air_quality(lat: float, lon: float, cache_key: Tuple[float, float]) -> Optional[AirQuality]:
+    """Fetch, parse and cache air quality data (see get_air_quality)."""
+    restored = _warm_from_snapshot("air_quality", cache_key)
+    if restored is not None:
+        return restored
+
+    try:
+        response = get_client().get(AIR_QUALITY_URL, _air_quality_params(lat, lon), endpoint="air_quality")
+        response.raise_for_status()
+
+        air_quality = _parse_air_quality(response.json())
+        _caches["air_quality"].set(cache_key, air_quality)
+        _store_snapshot("air_quality", cache_key, air_quality)
+        return air_quality
+    except:
+        logger.warning("Could not fetch air quality data")
+        return _offline_fallback("air_quality", cache_key, None)
+
+
+# Request building and response parsing, shared with async_weather_service
+
+def _location_params(city: str, location: Optional[Dict]) -> Dict[str, Union[str, float]]:
+    """Query by coordinates when the city is already geocoded, skipping name resolution."""
+    if location:
+        return {"lat": location["lat"], "lon": location["lon"]}
+    return {"q": city}
+
+
+def _weather_params(city: str, location: Optional[Dict] = None) -> Dict[str, Union[str, float]]:
+    return {
+        **_location_params(city, location),
+        "appid": API_KEY,
+        "units": "metric"
+    }
+
+
+def _forecast_params(city: str, days: int, location: Optional[Dict] = None) -> Dict[str, Union[str, float, int]]:
+    return {
+        **_location_params(city, location),
+        "appid": API_KEY,
+        "units": "metric",
+        "cnt": days * 8  # API returns data in 3-hour intervals
+    }
+
+
+def _air_quality_params(lat: float, lon: float) -> Dict[str, Union[str, float]]:
+    return {
         "lat": lat,
         "lon": lon,
         "appid": API_KEY
     }
 
+
+def _weather_status_error(status_code: int, city: str) -> Optional[Dict[str, str]]:
+    """Map current-weather statuses that deserve a friendly message to an error dict."""
+    if status_code == 404:
+        return {"error": f"City '{city}' not found"}
+    elif status_code == 401:
+        return {"error": "Invalid API key"}
+    return None
+
+
+def _parse_weather(data: Dict) -> Tuple[CurrentWeather, Tuple[float, float]]:
+    """
+    Convert a current-weather API response into a record.
+
+    Args:
+        data (dict): Decoded /weather response
+
+    Returns:
+        tuple: (weather info without air quality, (lat, lon))
+    """
+    weather_info = CurrentWeather(
+        city=data["name"],
+        temperature=data['main']['temp'],
+        feels_like=data['main']['feels_like'],
+        humidity=data['main']['humidity'],
+        wind_speed=data['wind']['speed'],
+        wind_deg=data['wind'].get('deg', 0),
+        condition=data["weather"][0]["main"].lower(),
+        description=data['weather'][0]['description'],
+        pressure=data['main']['pressure'],
+        visibility=data.get('visibility'),
+        sunrise=data['sys']['sunrise'],
+        sunset=data['sys']['sunset'],
+        observed_at=data.get("dt")
+    )
+
+    return weather_info, (data['coord']['lat'], data['coord']['lon'])
+
+
+def _parse_forecast(data: Dict) -> Forecast:
+    """
+    Read the 3-hourly entries of a forecast API response.
+
+    Args:
+        data (dict): Decoded /forecast response
+
+    Returns:
+        Forecast: Entries whose daily summaries are computed on first use
+    """
+    return Forecast.from_payload(data)
+
+
+def _apply_location(city: str, location: Optional[Dict], weather_info: CurrentWeather,
+                    data: Dict, coord: Tuple[float, float]) -> Tuple[CurrentWeather, Dict]:
+    """
+    Tie a current-weather response to the city's canonical location.
+
+    Coordinate queries can come back with a nearby station name, so the
+    cached canonical name is kept; name queries teach the cache a new location.
+
+    Returns:
+        tuple: (weather info, location)
+    """
+    if location:
+        return weather_info._replace(city=location["name"]), location
+    return weather_info, remember_location(city, data["name"], data.get("sys", {}).get("country"), *coord)
+
+
+def _remember_forecast_location(city: str, data: Dict) -> Optional[Dict]:
+    """Record the city location included in a forecast response."""
+    city_data = data.get('city', {})
+    if city_data.get('coord') and city_data.get('name'):
+        return remember_location(city, city_data['name'], city_data.get('country'),
+                                 city_data['coord']['lat'], city_data['coord']['lon'])
+    return None
+
+
+def _parse_air_quality(data: Dict) -> AirQuality:
+    """
+    Read the index from an air pollution API response.
+
+    Args:
+        data (dict): Decoded /air_pollution response
+
+    Returns:
+        AirQuality: Air quality index
+    """
+    return AirQuality(data['list'][0]['main']['aqi'])
+
+
+def _serve_cached(endpoint: str, cache_key, loader, *args) -> Optional[CurrentWeather]:
+    """
+    Return a cached response, flagging and refreshing it in the background if stale.
+
+    Args:
+        endpoint (str): Cache to read ("weather")
+        cache_key: Response cache key
+        loader: Function that fetches and caches a fresh response
+        *args: Arguments for loader
+
+    Returns:
+        CurrentWeather: Cached response (a copy with stale_age set if stale), or None
+    """
+    entry = _caches[endpoint].lookup(cache_key)
+    if entry is None:
+        return None
+
+    value, age = entry
+    stale_age = _stale_age(endpoint, (endpoint, cache_key), age, loader, *args)
+    if stale_age is None:
+        return value
+    return value._replace(stale_age=stale_age)
+
+
+def _stale_age(endpoint: str, flight_key, age: float, loader, *args) -> Optional[int]:
+    """Return the age in seconds of a stale entry (scheduling its refresh), or None if fresh."""
+    if age < _caches[endpoint].ttl:
+        return None
+
+    logger.info(f"Serving stale {endpoint} data ({int(age)}s old), refreshing in background")
+    _revalidate(flight_key, loader, *args)
+    return int(age)
+
+
+def _revalidate(flight_key, loader, *args) -> None:
+    """Refresh a cache entry on the worker pool, at most once at a time per key."""
+    with _revalidating_lock:
+        if flight_key in _revalidating:
+            return
+        _revalidating.add(flight_key)
+
+    def refresh():
+        try:
+            _flights.do(flight_key, loader, *args)
+        except Exception as e:
+            logger.error(f"Background refresh failed for {flight_key}: {str(e)}")
+        finally:
+            with _revalidating_lock:
+                _revalidating.discard(flight_key)
+
+    _executor.submit(refresh)
+
+
+def _store_snapshot(kind: str, cache_key, value) -> None:
+    """Persist a good response as compact JSON on the snapshot writer thread (last known good)."""
+    payload = json.dumps(to_plain(value), separators=(',', ':'), ensure_ascii=False)
+    _snapshot_writer.submit(save_weather_snapshot, kind, json.dumps(cache_key), payload)
+
+
+def _load_snapshot(kind: str, cache_key):
+    """Return (records, fetched_at) of a persisted response, or None if missing or unreadable."""
+    row = get_weather_snapshot(kind, json.dumps(cache_key))
+    if row is None:
+        return None
+
+    payload, fetched_at = row
     try:
-        response = requests.get(AIR_QUALITY_URL, params=params, timeout=10)
-        response.raise_for_status()
-        data = response.json()
+        return from_plain(SNAPSHOT_TYPES[kind], json.loads(payload)), fetched_at
+    except (TypeError, ValueError, KeyError) as e:
+        # Written in an older format; the next good response replaces it
+        logger.warning(f"Ignoring unreadable {kind} snapshot: {e}")
+        return None
 
-        aqi = data['list'][0]['main']['aqi']
-        aqi_labels = {
-            1: "Good 😊",
-            2: "Fair 🙂",
-            3: "Moderate 😐",
-            4: "Poor 😷",
-            5: "Very Poor 🤢"
-        }
 
-        return {
-            "air_quality": aqi_labels.get(aqi, "Unknown"),
-            "air_quality_index": aqi
-        }
-    except:
-        logger.warning("Could not fetch air quality data")
-        return {}
+def _warm_from_snapshot(kind: str, cache_key):
+    """On a cold cache, reuse a persisted response that is still within its TTL."""
+    snapshot = _load_snapshot(kind, cache_key)
+    if snapshot is None:
+        return None
 
+    value, fetched_at = snapshot
+    age = time.time() - fetched_at
+    if age >= _caches[kind].ttl:
+        return None
 
-def get_wind_direction(degrees: float) -> str:
+    _caches[kind].set(cache_key, value, age=age)
+    logger.info(f"Restored {kind} data from snapshot ({int(age)}s old)")
+    return value
+
+
+def _offline_fallback(kind: str, cache_key, error):
+    """
+    Serve the last known good response when the upstream request failed.
+
+    Returns:
+        The snapshot (current weather gets offline_as_of set), or error if no
+        snapshot exists
+    """
+    snapshot = _load_snapshot(kind, cache_key)
+    if snapshot is None:
+        return error
+
+    value, fetched_at = snapshot
+    as_of = datetime.fromtimestamp(fetched_at).strftime('%Y-%m-%d %H:%M')
+    logger.warning(f"Weather service unavailable, serving {kind} snapshot from {as_of}")
+    if kind == "weather":
+        return value._replace(offline_as_of=fetched_at)
+    return value
+
+
+def configure_stale_while_revalidate(enabled: bool, max_stale: Optional[float] = None) -> None:
+    """
+    Turn stale-while-revalidate serving on or off.
+
+    Args:
+        enabled (bool): Serve expired entries while refreshing them in the background
+        max_stale (float): Seconds past expiry an entry may be served (default MAX_STALE)
+    """
+    for cache in _caches.values():
+        cache.max_stale = (max_stale if max_stale is not None else MAX_STALE) if enabled else 0
+
+
+def normalize_city(city: str) -> str:
+    """
+    Normalize a city query so equivalent spellings share a cache entry.
+
+    Args:
+        city (str): City name as typed by the user, e.g. " London , GB"
+
+    Returns:
+        str: Lower-cased name with collapsed whitespace, e.g. "london,gb"
+    """
+    parts = [" ".join(part.split()) for part in city.split(",")]
+    return ",".join(part for part in parts if part).lower()
+
+
+def resolve_city(city: str) -> Optional[Dict]:
+    """
+    Look up a city's canonical name and coordinates without calling the API.
+
+    Checks the in-memory cache first, then the city_locations table.
+
+    Args:
+        city (str): City name as typed by the user
+
+    Returns:
+        dict: name, country, lat and lon, or None if the city was never resolved
+    """
+    query = normalize_city(city)
+    location = _locations.get(query)
+    if location is None:
+        location = get_city_location(query)
+        if location is not None:
+            _locations.set(query, location)
+    return location
+
+
+def remember_location(city: str, name: str, country: Optional[str], lat: float, lon: float) -> Dict:
+    """
+    Cache a resolved location under the query and its canonical spellings.
+
+    "london", "London " and "London,GB" all map to the same entry, so they
+    share one cache key and one upstream fetch. The bare name is only an
+    alias when the query was the bare name or the name with the same
+    country: "London, ON" resolves to Ontario, but must not make every plain
+    "London" lookup go to Canada.
+
+    Returns:
+        dict: The stored location
+    """
+    location = {"name": name, "country": country, "lat": lat, "lon": lon}
+    query = normalize_city(city)
+    queries = {query}
+    if country:
+        qualified_name = normalize_city(f"{name},{country}")
+        queries.add(qualified_name)
+        if query == qualified_name:
+            queries.add(normalize_city(name))
+
+    new_queries = [query for query in queries if _locations.get(query) != location]
+    for query in queries:
+        _locations.set(query, location)
+    if new_queries:
+        save_city_location(new_queries, name, country, lat, lon)
+    return location
+
+
+def _location_key(city: str, location: Optional[Dict]):
+    """Response cache key: rounded coordinates once geocoded, else the normalized name."""
+    if location:
+        return coord_key(location["lat"], location["lon"])
+    return normalize_city(city)
+
+
+def coord_key(lat: float, lon: float) -> Tuple[float, float]:
     """
-    Convert wind degrees to cardinal direction.
+    Round coordinates to ~1 km so nearby lookups share a cache entry.
 
     Args:
-        degrees (float): Wind direction in degrees
+        lat (float): Latitude
+        lon (float): Longitude
 
     Returns:
-        str: Cardinal direction
+        tuple: Rounded (lat, lon) pair
     """
-    directions = [
-        "North", "North-Northeast", "Northeast", "East-Northeast",
-        "East", "East-Southeast", "Southeast", "South-Southeast",
-        "South", "South-Southwest", "Southwest", "West-Southwest",
-        "West", "West-Northwest", "Northwest", "North-Northwest"
-    ]
-    index = round(degrees / (360 / len(directions))) % len(directions)
-    return directions[index]
+    return round(float(lat), 2), round(float(lon), 2)
 
 
-def format_date(date_str: str) -> str:
+def configure_cache(endpoint: str, ttl: Optional[float] = None,
+                    max_entries: Optional[int] = None) -> None:
     """
-    Format date string to more readable format.
+    Change the expiry or size of one endpoint's response cache.
 
     Args:
-        date_str (str): Date string in YYYY-MM-DD format
+        endpoint (str): One of "weather", "forecast" or "air_quality"
+        ttl (float): New time-to-live in seconds
+        max_entries (int): New maximum number of cached responses
+    """
+    cache = _caches[endpoint]
+    if ttl is not None:
+        cache.ttl = ttl
+    if max_entries is not None:
+        cache.max_entries = max_entries
+
+
+def get_cache_stats() -> Dict[str, Dict]:
+    """
+    Report size and hit/miss counters for each endpoint cache.
+
+    Returns:
+        dict: Cache statistics keyed by endpoint name
+    """
+    return {endpoint: cache.stats() for endpoint, cache in _caches.items()}
+
+
+def get_http_stats() -> Dict[str, Dict]:
+    """
+    Report attempt counts, retries and latency of recent upstream requests.
+
+    Returns:
+        dict: Request statistics keyed by endpoint name
+    """
+    return get_client().stats()
+
+
+def get_upstream_health() -> Dict[str, Union[str, Dict]]:
+    """
+    Report the health of the OpenWeather API for a health endpoint.
 
     Returns:
-        str: Formatted date string
+        dict: "status" ("ok" when every circuit is closed, else "degraded"),
+        per-endpoint "circuits", recent "http" statistics and "cache" statistics
     """
-    date_obj = datetime.strptime(date_str, '%Y-%m-%d')
-    return date_obj.strftime('%A, %B %d')  # e.g., "Monday, January 15"
+    circuits = get_client().health()
+    healthy = all(circuit["state"] == "closed" for circuit in circuits.values())
+    return {
+        "status": "ok" if healthy else "degraded",
+        "circuits": circuits,
+        "http": get_http_stats(),
+        "cache": get_cache_stats()
+    }
+
+
+def clear_cache() -> None:
+    """Drop all cached responses."""
+    for cache in _caches.values():
+        cache.clear()
 
 
 def calculate_feels_like(temperature: float, humidity: float, wind_speed: float) -> float:
@@ -318,50 +923,17 @@ if __name__ == "__main__":
     # Test the weather service
     test_city = "London"
     weather = get_weather(test_city)
-    if "error" not in weather:
+    if not is_error(weather):
         print(f"\nCurrent weather in {test_city}:")
-        for key, value in weather.items():
-            if key not in ['recommendations', 'raw_temp', 'raw_condition']:
-                print(f"{key}: {value}")
+        for key, value in weather.display().items():
+            print(f"{key}: {value}")
 
     forecast = get_forecast(test_city)
     if isinstance(forecast, list):
         print(f"\nForecast for {test_city}:")
         for day in forecast:
-            print(f"\n{day['date']}:")
-            print(f"Temperature: {day['temperature']}")
-            print(f"Condition: {day['condition']}")
-            print(f"Recommendation: {day['recommendations']}")
-def get_weather(city):
-    """Fetch weather data from OpenWeatherMap API."""
-    if not API_KEY:
-        return {"error": "API key not configured"}
-    
-    params = {
-        "q": city,
-        "appid": API_KEY,
-        "units": "metric"
-    }
-    
-    try:
-        response = requests.get(BASE_URL, params=params)
-        
-        if response.status_code == 404:
-            return {"error": f"City '{city}' not found"}
-        elif response.status_code == 401:
-            return {"error": "Invalid API key"}
-        
-        response.raise_for_status()
-        data = response.json()
-        
-        return {
-            "city": data.get("name", "Unknown City"),
-            "temperature": f"{data['main']['temp']}°C",
-            "humidity": f"{data['main']['humidity']}%",
-            "wind_speed": f"{data['wind']['speed']} m/s",
-            "condition": data['weather'][0]['description'].capitalize()
-        }
-    except requests.exceptions.ConnectionError:
-        return {"error": "Connection error. Please check your internet."}
-    except requests.exceptions.RequestException as e:
-        return {"error": f"Error fetching weather data: {str(e)}"}
\ No newline at end of file
+            formatted = day.display()
+            print(f"\n{formatted['date']}:")
+            print(f"Temperature: {formatted['temperature']}")
+            print(f"Condition: {formatted['condition']}")
+            print(f"Recommendation: {formatted['recommendations']}")